@@ -0,0 +1,318 @@
+"""
+Build (and query) one SQLite database of everything in the "data" and "setlists" directories,
+so that questions across artists, tours, venues, and albums
+are single indexed SQL queries rather than loops over csv and json files.
+
+Tables:
+- `events`: one row per event ("data" / f"{artist}_event_date_tour_venue.csv"), with ISO dates;
+- `venues`: venue names and capacities ("data" / f"{artist}_venue_capacity.csv");
+- `tracks`: Spotify tracks and albums
+  ("data" / f"{artist}_albums.csv", or failing that, "data" / f"{artist}_tracks.csv");
+- `performances`: one row per song per setlist ("setlists/{event_id}.json"),
+  with its position, set, encore flag, and the cover, tape, and info fields.
+
+`build_database` is incremental: setlists already loaded are skipped
+(the small csv-based tables are simply reloaded).
+For instance, after `build_database()`:
+
+    query(
+        "SELECT e.artist, AVG(v.capacity) FROM performances p "
+        "JOIN events e USING (event_id) JOIN venues v USING (venue_id) "
+        "WHERE p.song = ? GROUP BY e.artist", ("Yellow",)
+    )
+"""
+
+__author__ = "Mark Gotham"
+
+from functools import lru_cache
+from pathlib import Path
+import sqlite3
+import time
+from typing import Optional, Union
+
+import pandas as pd
+
+from local_setlists_combine import find_artists, load_events, load_setlist
+from utils import SETLISTS_DB, THIS_DIR
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    event_id TEXT PRIMARY KEY,
+    artist TEXT NOT NULL,
+    date TEXT,
+    year INTEGER,
+    tour_name TEXT,
+    venue_id TEXT,
+    venue_name TEXT
+);
+CREATE TABLE IF NOT EXISTS venues (
+    venue_id TEXT PRIMARY KEY,
+    venue_name TEXT,
+    capacity REAL,
+    url TEXT
+);
+CREATE TABLE IF NOT EXISTS tracks (
+    artist TEXT NOT NULL,
+    track TEXT NOT NULL,
+    found TEXT,
+    spotify_id TEXT,
+    album_id TEXT,
+    album TEXT,
+    album_type TEXT,
+    release_date TEXT
+);
+CREATE TABLE IF NOT EXISTS performances (
+    event_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    set_index INTEGER NOT NULL,
+    encore INTEGER NOT NULL,
+    song TEXT NOT NULL,
+    cover TEXT,
+    tape INTEGER NOT NULL,
+    info TEXT,
+    PRIMARY KEY (event_id, position)
+) WITHOUT ROWID;
+"""
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS events_artist_date ON events (artist, date);
+CREATE INDEX IF NOT EXISTS events_artist_tour ON events (artist, tour_name);
+CREATE INDEX IF NOT EXISTS events_venue ON events (venue_id);
+CREATE INDEX IF NOT EXISTS tracks_artist_track ON tracks (artist, track);
+CREATE INDEX IF NOT EXISTS tracks_album ON tracks (album_id);
+CREATE INDEX IF NOT EXISTS performances_song ON performances (song, event_id);
+"""
+
+
+def _performance_rows(
+        event_id: str,
+        setlist_data: list
+) -> list:
+    """
+    One row per song in a setlist, in the column order of the `performances` table.
+    """
+    rows = []
+    position = 0
+    set_index = 0
+    for top_level_item in setlist_data:
+        if "song" not in top_level_item.keys():
+            continue
+        encore = int(bool(top_level_item.get("encore")))
+        for song in top_level_item["song"]:
+            rows.append((
+                event_id,
+                position,
+                set_index,
+                encore,
+                song["name"],
+                song.get("cover", {}).get("name"),
+                int(bool(song.get("tape"))),
+                song.get("info")
+            ))
+            position += 1
+        set_index += 1
+    return rows
+
+
+def _load_tracks(artist_name: str) -> Optional[pd.DataFrame]:
+    """
+    This artist's tracks, with album data if available. None if there is neither file.
+    """
+    for name in (f"{artist_name}_albums.csv", f"{artist_name}_tracks.csv"):
+        path_to_file = THIS_DIR / "data" / name
+        if path_to_file.exists():
+            df = pd.read_csv(path_to_file, sep=",", dtype=str)
+            return df.reindex(columns=["track", "found", "id", "album_id", "album", "type", "release_date"])
+    return None
+
+
+def build_database(
+        artist_names: Optional[list] = None,
+        db_path: Union[Path, str] = SETLISTS_DB,
+        rebuild: bool = False
+) -> None:
+    """
+    Load events, venues, tracks, and setlists into the database at `db_path`.
+
+    Args:
+        artist_names (list, optional): Artists to include. Defaults to all (see `local_setlists_combine.find_artists`).
+        db_path: Where to write the database.
+        rebuild (bool): Reload every setlist, not only those not yet loaded.
+    """
+    start = time.perf_counter()
+    if artist_names is None:
+        artist_names = find_artists()
+
+    connection = sqlite3.connect(db_path)
+    connection.executescript(SCHEMA)
+    if rebuild:
+        connection.execute("DELETE FROM performances")
+    loaded = {row[0] for row in connection.execute("SELECT DISTINCT event_id FROM performances")}
+
+    for artist_name in artist_names:
+        df = load_events(artist_name)
+        connection.execute("DELETE FROM events WHERE artist = ?", (artist_name,))
+        connection.executemany(
+            "INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    event_id,
+                    artist_name,
+                    None if pd.isna(date) else date.strftime("%Y-%m-%d"),
+                    None if pd.isna(date) else date.year,
+                    None if pd.isna(tour_name) else tour_name,
+                    venue_id,
+                    venue_name
+                )
+                for event_id, date, tour_name, venue_id, venue_name in zip(
+                    df["event_id"], df["date"], df["tour_name"], df["venue_id"], df["venue_name"]
+                )
+            ]
+        )
+
+        rows = []
+        for event_id in df["event_id"]:
+            if event_id in loaded:
+                continue
+            try:
+                rows.extend(_performance_rows(event_id, load_setlist(event_id, cache=False)))
+            except FileNotFoundError:
+                continue
+            loaded.add(event_id)
+        connection.executemany("INSERT OR REPLACE INTO performances VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+        capacity_file = THIS_DIR / "data" / f"{artist_name}_venue_capacity.csv"
+        if capacity_file.exists():
+            venues = pd.read_csv(capacity_file, sep=",", dtype={"venue_id": str, "venue_name": str, "url": str})
+            venues = venues.drop_duplicates("venue_id")
+            connection.executemany(
+                "INSERT OR REPLACE INTO venues VALUES (?, ?, ?, ?)",
+                [
+                    (venue_id, venue_name, None if pd.isna(capacity) else float(capacity), url)
+                    for venue_id, venue_name, capacity, url in zip(
+                        venues["venue_id"], venues["venue_name"],
+                        pd.to_numeric(venues["capacity"], errors="coerce"), venues["url"]
+                    )
+                ]
+            )
+
+        tracks = _load_tracks(artist_name)
+        if tracks is not None:
+            connection.execute("DELETE FROM tracks WHERE artist = ?", (artist_name,))
+            connection.executemany(
+                "INSERT INTO tracks VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(artist_name, *(None if pd.isna(x) else x for x in row)) for row in tracks.itertuples(index=False)]
+            )
+
+        connection.commit()
+        print(f"{artist_name}: {len(df)} events, {len(rows)} new song performances")
+
+    connection.executescript(INDEXES)
+    connection.execute("ANALYZE")
+    connection.commit()
+    connection.close()
+    open_database.cache_clear()
+    print(f"Built {db_path} in {time.perf_counter() - start:.1f}s")
+
+
+@lru_cache(maxsize=None)
+def open_database(db_path: Union[Path, str] = SETLISTS_DB) -> sqlite3.Connection:
+    """
+    Open (once) a read-only connection to the database.
+    """
+    if not Path(db_path).exists():
+        raise FileNotFoundError(f"No database at {db_path}. See `build_database`.")
+    return sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+
+
+def query(
+        sql: str,
+        params: tuple = (),
+        db_path: Union[Path, str] = SETLISTS_DB
+) -> pd.DataFrame:
+    """
+    Run any (read-only) SQL query on the database and return the result as a DataFrame.
+    """
+    return pd.read_sql_query(sql, open_database(db_path), params=params)
+
+
+def song_history(
+        song: str,
+        artist_name: Optional[str] = None,
+        db_path: Union[Path, str] = SETLISTS_DB
+) -> pd.DataFrame:
+    """
+    Every performance of a song (by any artist, unless `artist_name` is given), in date order,
+    with the event, tour, venue (and its capacity), and the song's place in the setlist.
+    """
+    sql = (
+        "SELECT e.artist, e.date, e.event_id, e.tour_name, e.venue_name, v.capacity, "
+        "p.position, p.set_index, p.encore, p.cover, p.tape, p.info "
+        "FROM performances p JOIN events e USING (event_id) LEFT JOIN venues v USING (venue_id) "
+        "WHERE p.song = ?"
+    )
+    params = (song,)
+    if artist_name is not None:
+        sql += " AND e.artist = ?"
+        params += (artist_name,)
+    return query(sql + " ORDER BY e.date", params, db_path)
+
+
+def tour_summary(
+        artist_name: Optional[str] = None,
+        db_path: Union[Path, str] = SETLISTS_DB
+) -> pd.DataFrame:
+    """
+    Per tour: dates, number of shows (with a setlist), distinct songs, mean setlist length,
+    and mean venue capacity.
+    """
+    sql = (
+        "SELECT e.artist, e.tour_name, MIN(e.date) AS first_date, MAX(e.date) AS last_date, "
+        "COUNT(DISTINCT e.event_id) AS shows, "
+        "(SELECT COUNT(DISTINCT p.song) FROM performances p JOIN events e2 USING (event_id) "
+        "WHERE e2.artist = e.artist AND e2.tour_name = e.tour_name) AS distinct_songs, "
+        "(SELECT COUNT(*) FROM performances p JOIN events e2 USING (event_id) "
+        "WHERE e2.artist = e.artist AND e2.tour_name = e.tour_name) * 1.0 / COUNT(DISTINCT e.event_id) "
+        "AS mean_length, "
+        "AVG(v.capacity) AS mean_capacity "
+        "FROM events e LEFT JOIN venues v USING (venue_id) "
+        "WHERE e.tour_name IS NOT NULL AND EXISTS (SELECT 1 FROM performances p WHERE p.event_id = e.event_id)"
+    )
+    params = ()
+    if artist_name is not None:
+        sql += " AND e.artist = ?"
+        params = (artist_name,)
+    return query(sql + " GROUP BY e.artist, e.tour_name ORDER BY e.artist, first_date", params, db_path)
+
+
+def album_plays(
+        artist_name: str,
+        tour_name: Optional[str] = None,
+        db_path: Union[Path, str] = SETLISTS_DB
+) -> pd.DataFrame:
+    """
+    How often songs from each album were played (on one tour, or all the artist's shows),
+    via the Spotify tracks table. Songs with no known album count under None.
+    Each performance counts once, with one album per song title
+    (a medley has one tracks row per part, and there may be duplicate rows):
+    the first alphabetically, with its release date (SQLite takes bare columns from the `MIN` row).
+    """
+    sql = (
+        "SELECT t.album, t.release_date, COUNT(*) AS plays, COUNT(DISTINCT p.song) AS songs "
+        "FROM performances p JOIN events e USING (event_id) "
+        "LEFT JOIN (SELECT artist, track, MIN(album) AS album, release_date FROM tracks GROUP BY artist, track) t "
+        "ON t.artist = e.artist AND t.track = p.song "
+        "WHERE e.artist = ?"
+    )
+    params = (artist_name,)
+    if tour_name is not None:
+        sql += " AND e.tour_name = ?"
+        params += (tour_name,)
+    return query(sql + " GROUP BY t.album ORDER BY plays DESC", params, db_path)
+
+
+if __name__ == "__main__":
+    build_database()
+    print(tour_summary("Coldplay"))
+    print(song_history("Yellow", "Coldplay"))
@@ -0,0 +1,255 @@
+"""
+An inverted index from songs to the events (shows) that include them:
+for each song, a posting list of (event, position, set index) sorted by event.
+
+This answers questions like
+"every show where Yellow opened" or "shows containing both X and Y"
+with a few array operations on the relevant posting lists,
+rather than loading every setlist via `local_setlists_combine.event_id_2_song_list`.
+
+Postings are held in compact arrays (CSR-style: one flat array per field plus offsets per song).
+New setlists are added incrementally (and merged in on the next query),
+and the whole index saves to a single compressed `.npz` file.
+"""
+
+__author__ = "Mark Gotham"
+
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+
+from local_setlists_combine import load_events, load_setlist, setlist_2_sets
+from utils import THIS_DIR
+
+
+class PostingsIndex:
+    """
+    Song -> sorted posting list of (event, position, set index).
+
+    Songs are identified by (artist, song name) and interned to integer IDs;
+    events are numbered in the order added, so posting lists stay sorted as new events arrive.
+    Positions are 0-indexed across the whole setlist; set indices are 0-indexed
+    (encores count as sets, in order).
+    """
+
+    def __init__(self):
+        self.event_ids = []
+        self.song_names = []
+        self.song_artists = []
+        self._event_numbers = {}
+        self._song_ids = {}
+        self._event_lengths = []
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._events = np.zeros(0, dtype=np.int32)
+        self._positions = np.zeros(0, dtype=np.int16)
+        self._sets = np.zeros(0, dtype=np.int8)
+        self._pending = []  # (song ID, event number, position, set index) not yet merged in
+
+    def __len__(self) -> int:
+        return len(self.event_ids)
+
+    def song_id(
+            self,
+            artist: str,
+            song_name: str
+    ) -> Optional[int]:
+        """
+        The ID for this artist's song, or None if it is not in the index.
+        """
+        return self._song_ids.get((artist, song_name))
+
+    def _intern(
+            self,
+            artist: str,
+            song_name: str
+    ) -> int:
+        key = (artist, song_name)
+        song_id = self._song_ids.get(key)
+        if song_id is None:
+            song_id = self._song_ids[key] = len(self.song_names)
+            self.song_names.append(song_name)
+            self.song_artists.append(artist)
+        return song_id
+
+    def add_setlist(
+            self,
+            artist: str,
+            event_id: str,
+            setlist_data: list
+    ) -> bool:
+        """
+        Add one setlist (the json data, as from `local_setlists_combine.load_setlist`).
+
+        Returns:
+            bool: False if this event had already been added (and so was skipped).
+        """
+        if event_id in self._event_numbers:
+            return False
+        event_number = self._event_numbers[event_id] = len(self.event_ids)
+        self.event_ids.append(event_id)
+
+        position = 0
+        for set_index, (_, song_names) in enumerate(setlist_2_sets(setlist_data)):
+            for name in song_names:
+                self._pending.append((self._intern(artist, name), event_number, position, set_index))
+                position += 1
+        self._event_lengths.append(position)
+        return True
+
+    def add_artist(self, artist_name: str) -> int:
+        """
+        Add any new events for an artist listed at "data" / f"{artist_name}_event_date_tour_venue.csv".
+        Events with no file at "setlists/{event_id}.json" are skipped.
+
+        Returns:
+            int: The number of events added.
+        """
+        event_ids = load_events(artist_name)["event_id"]
+        count = 0
+        for event_id in event_ids:
+            if event_id in self._event_numbers:
+                continue
+            try:
+                setlist_data = load_setlist(event_id, cache=False)
+            except FileNotFoundError:
+                continue
+            count += self.add_setlist(artist_name, event_id, setlist_data)
+        return count
+
+    def _merge(self) -> None:
+        """
+        Merge pending postings into the arrays.
+        Pending events all come after existing ones, so a stable sort by song keeps every list sorted by event.
+        """
+        if not self._pending:
+            return
+        new = np.array(self._pending, dtype=np.int64)
+        self._pending = []
+
+        n_songs = len(self.song_names)
+        old_counts = np.diff(self._offsets)
+        old_songs = np.repeat(np.arange(len(old_counts)), old_counts)
+
+        songs = np.concatenate([old_songs, new[:, 0]])
+        order = np.argsort(songs, kind="stable")
+        self._events = np.concatenate([self._events, new[:, 1].astype(np.int32)])[order]
+        self._positions = np.concatenate([self._positions, new[:, 2].astype(np.int16)])[order]
+        self._sets = np.concatenate([self._sets, new[:, 3].astype(np.int8)])[order]
+        self._offsets = np.concatenate([[0], np.cumsum(np.bincount(songs, minlength=n_songs))])
+
+    def postings(
+            self,
+            artist: str,
+            song_name: str
+    ) -> tuple:
+        """
+        The posting list for a song.
+
+        Returns:
+            tuple: Arrays of event numbers (sorted; see `event_ids`), positions, and set indices.
+            All empty if the song is not in the index.
+        """
+        self._merge()
+        song_id = self.song_id(artist, song_name)
+        if song_id is None:
+            return self._events[:0], self._positions[:0], self._sets[:0]
+        start, end = self._offsets[song_id], self._offsets[song_id + 1]
+        return self._events[start:end], self._positions[start:end], self._sets[start:end]
+
+    def events_where(
+            self,
+            artist: str,
+            song_name: str,
+            position: Optional[int] = None,
+            position_from_end: Optional[int] = None,
+            set_index: Optional[int] = None
+    ) -> np.ndarray:
+        """
+        Event numbers of the shows including this song, optionally only
+        at a given `position` (0 = opener),
+        `position_from_end` (0 = closer),
+        and/or in a given set (`set_index`).
+        """
+        events, positions, sets = self.postings(artist, song_name)
+        mask = np.ones(len(events), dtype=bool)
+        if position is not None:
+            mask &= positions == position
+        if position_from_end is not None:
+            lengths = np.asarray(self._event_lengths)[events]
+            mask &= lengths - 1 - positions == position_from_end
+        if set_index is not None:
+            mask &= sets == set_index
+        return np.unique(events[mask])
+
+    def events_with(
+            self,
+            artist: str,
+            song_names: list,
+            mode: str = "all"
+    ) -> list:
+        """
+        The event IDs of shows including all (intersection) or any (union) of these songs.
+
+        Args:
+            artist (str): The artist.
+            song_names (list): The songs.
+            mode (str): "all" or "any".
+        """
+        if mode not in ("all", "any"):
+            raise ValueError("`mode` must be 'all' or 'any'.")
+        result = None
+        for name in song_names:
+            events = self.events_where(artist, name)
+            if result is None:
+                result = events
+            elif mode == "all":
+                result = np.intersect1d(result, events, assume_unique=True)
+            else:
+                result = np.union1d(result, events)
+        if result is None:
+            return []
+        return [self.event_ids[i] for i in result]
+
+    def save(self, path: Union[Path, str] = THIS_DIR / "data" / "postings.npz") -> None:
+        """
+        Save the index as a single compressed `.npz` file.
+        """
+        self._merge()
+        np.savez_compressed(
+            path,
+            event_ids=np.array(self.event_ids, dtype=str),
+            event_lengths=np.array(self._event_lengths, dtype=np.int32),
+            song_names=np.array(self.song_names, dtype=str),
+            song_artists=np.array(self.song_artists, dtype=str),
+            offsets=self._offsets,
+            events=self._events,
+            positions=self._positions,
+            sets=self._sets
+        )
+
+    @classmethod
+    def load(cls, path: Union[Path, str] = THIS_DIR / "data" / "postings.npz") -> "PostingsIndex":
+        """
+        Load an index saved with `save`.
+        """
+        index = cls()
+        with np.load(path) as data:
+            index.event_ids = data["event_ids"].tolist()
+            index._event_lengths = data["event_lengths"].tolist()
+            index.song_names = data["song_names"].tolist()
+            index.song_artists = data["song_artists"].tolist()
+            index._offsets = data["offsets"]
+            index._events = data["events"]
+            index._positions = data["positions"]
+            index._sets = data["sets"]
+        index._event_numbers = {event_id: i for i, event_id in enumerate(index.event_ids)}
+        index._song_ids = {key: i for i, key in enumerate(zip(index.song_artists, index.song_names))}
+        return index
+
+
+if __name__ == "__main__":
+    postings = PostingsIndex()
+    postings.add_artist("Coldplay")
+    print("Opened with Yellow:", [postings.event_ids[i] for i in postings.events_where("Coldplay", "Yellow", position=0)])
+    print("Both Yellow and Fix You:", postings.events_with("Coldplay", ["Yellow", "Fix You"]))
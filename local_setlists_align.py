@@ -0,0 +1,351 @@
+"""
+Align all the setlists on a tour to a consensus: the tour's canonical setlist.
+
+Proportional position (see `local_setlists_combine.plot_cross_tour_correspondence`)
+lines shows up only roughly: one extra song early in a show shifts everything after it.
+Here, instead, each show is aligned to the consensus by dynamic programming
+(matches are free, each inserted or deleted song costs 1),
+so every song is either matched to a consensus position or marked as an insertion,
+and every consensus song a show lacks is a deletion.
+
+The consensus is built progressively:
+start from the medoid show (the one closest to all others),
+align every show to it,
+then keep the consensus songs that most shows match
+and add the songs that most shows insert at the same place.
+Repeat until the consensus stops changing.
+
+For speed, all the shows on a tour are aligned to the consensus together,
+with one NumPy operation per consensus song rather than per cell,
+and only a diagonal band of each alignment matrix is computed (see `align_to_consensus`).
+"""
+
+__author__ = "Mark Gotham"
+
+import time
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from local_setlists_combine import SetlistCorpus, edit_distances, find_artists
+
+INF = 1 << 30
+
+
+def _pad(
+        songs: np.ndarray,
+        offsets: np.ndarray
+) -> np.ndarray:
+    """
+    From the flat (CSR) form to one row per setlist, padded with -1.
+    """
+    lengths = np.diff(offsets)
+    padded = np.full((len(lengths), max(lengths.max(initial=0), 1)), -1, dtype=np.int64)
+    rows = np.repeat(np.arange(len(lengths)), lengths)
+    columns = np.arange(len(songs)) - np.repeat(offsets[:-1], lengths)
+    padded[rows, columns] = songs
+    return padded
+
+
+def _gather(
+        band: np.ndarray,
+        columns: np.ndarray
+) -> np.ndarray:
+    """
+    Values from each row of `band` at `columns`, or INF for columns outside the band.
+    """
+    inside = (columns >= 0) & (columns < band.shape[1])
+    values = np.take_along_axis(band, np.clip(columns, 0, band.shape[1] - 1), axis=1)
+    return np.where(inside, values, INF)
+
+
+def align_to_consensus(
+        consensus: np.ndarray,
+        songs: np.ndarray,
+        offsets: np.ndarray,
+        band: int = 8
+) -> tuple:
+    """
+    Align each of several setlists to one consensus sequence.
+
+    For a show of length `L` and a consensus of length `n`,
+    row `i` of the alignment matrix is computed only within `band` cells of column `i * L / n`
+    (the band is widened where needed to keep a path through it),
+    so the work per show is proportional to `n * band`, however long the show.
+    All shows are aligned together, one consensus song (row) at a time.
+
+    Args:
+        consensus (np.ndarray): The consensus song IDs.
+        songs (np.ndarray): The setlists' song IDs, end to end (e.g., from `SetlistCorpus.subset`).
+        offsets (np.ndarray): Where each setlist starts in `songs` (plus the total at the end).
+        band (int): Half-width of the band.
+
+    Returns:
+        tuple: (for each entry in `songs`, the index of the consensus position it is matched to, or -1;
+        the alignment cost (number of insertions plus deletions) for each setlist).
+    """
+    lengths = np.diff(offsets).astype(np.int64)
+    n = len(consensus)
+    if n == 0 or len(songs) == 0:
+        return np.full(len(songs), -1, dtype=np.int64), lengths + n
+
+    band = max(band, int(np.ceil(lengths.max() / n)) + 1)
+    width = 2 * band + 1
+    d = np.arange(width)
+    padded = _pad(songs, offsets)
+    shows = np.arange(len(lengths))
+
+    # First column of the band in each row, for each show
+    starts = np.rint(np.arange(n + 1)[:, None] * lengths[None, :] / n).astype(np.int64) - band
+
+    scores = np.empty((n + 1, len(lengths), width), dtype=np.int64)
+    columns = starts[0][:, None] + d
+    scores[0] = np.where((columns >= 0) & (columns <= lengths[:, None]), columns, INF)
+    for i in range(1, n + 1):
+        columns = starts[i][:, None] + d
+        valid = (columns >= 0) & (columns <= lengths[:, None])
+        shift = (starts[i] - starts[i - 1])[:, None]
+        up = _gather(scores[i - 1], d + shift) + 1
+        previous_song = np.take_along_axis(padded, np.clip(columns - 1, 0, padded.shape[1] - 1), axis=1)
+        match = valid & (columns >= 1) & (previous_song == consensus[i - 1])
+        diagonal = np.where(match, _gather(scores[i - 1], d + shift - 1), INF)
+        best = np.where(valid, np.minimum(up, diagonal), INF)
+        # Insertions within the row: each cell is at most its left neighbour + 1
+        best = np.minimum.accumulate(best - columns, axis=1) + columns
+        scores[i] = np.minimum(np.where(valid, best, INF), INF)
+
+    costs = scores[n, shows, lengths - starts[n]]
+
+    # Trace back all shows together, preferring matches, then deletions, then insertions.
+    matched = np.full(padded.shape, -1, dtype=np.int64)
+    i = np.full(len(lengths), n)
+    j = lengths.copy()
+    active = (i > 0) | (j > 0)
+    while active.any():
+        s, si, sj = shows[active], i[active], j[active]
+        current = scores[si, s, sj - starts[si, s]]
+        previous_row = np.maximum(si - 1, 0)
+
+        def previous(column):
+            index = column - starts[previous_row, s]
+            inside = (si > 0) & (index >= 0) & (index < width)
+            return np.where(inside, scores[previous_row, s, np.clip(index, 0, width - 1)], INF)
+
+        is_match = (
+            (si > 0) & (sj > 0)
+            & (padded[s, np.maximum(sj - 1, 0)] == consensus[np.maximum(si - 1, 0)])
+            & (previous(sj - 1) == current)
+        )
+        is_deletion = ~is_match & (previous(sj) + 1 == current)
+        matched[s[is_match], sj[is_match] - 1] = si[is_match] - 1
+        i[s] = si - (is_match | is_deletion)
+        j[s] = sj - ~is_deletion
+        active = (i > 0) | (j > 0)
+
+    return matched[np.repeat(shows, lengths), np.arange(len(songs)) - np.repeat(offsets[:-1], lengths)], costs
+
+
+def update_consensus(
+        consensus: np.ndarray,
+        songs: np.ndarray,
+        offsets: np.ndarray,
+        matched: np.ndarray,
+        min_support: float = 0.5
+) -> np.ndarray:
+    """
+    One refinement step of the consensus, given the current alignment (from `align_to_consensus`):
+    keep each consensus song matched by more than `min_support` of the shows,
+    and add each song inserted by more than `min_support` of the shows in the same gap
+    (between the same two consensus positions).
+    Songs inserted in the same gap are ordered by their mean distance from the start of the gap.
+    """
+    n_shows = len(offsets) - 1
+    threshold = min_support * n_shows
+    support = np.bincount(matched[matched >= 0], minlength=len(consensus))
+
+    # For each song, the last consensus position matched so far in its show, and where that was
+    lengths = np.diff(offsets)
+    padded = _pad(matched, offsets)
+    last = np.maximum.accumulate(padded, axis=1)
+    positions = np.where(padded >= 0, np.arange(padded.shape[1]), -1)
+    last_position = np.maximum.accumulate(positions, axis=1)
+    flat = (np.repeat(np.arange(n_shows), lengths), np.arange(len(songs)) - np.repeat(offsets[:-1], lengths))
+    gaps = last[flat] + 1
+    distances = flat[1] - last_position[flat]
+
+    inserted = matched < 0
+    insertions = {}
+    if inserted.any():
+        pairs, inverse, counts = np.unique(
+            np.stack([gaps[inserted], songs[inserted]], axis=1),
+            axis=0, return_inverse=True, return_counts=True
+        )
+        mean_distance = np.bincount(inverse.ravel(), weights=distances[inserted]) / counts
+        for (gap, song), count, distance in zip(pairs, counts, mean_distance):
+            if count > threshold:
+                insertions.setdefault(gap, []).append((distance, song))
+
+    result = []
+    for k in range(len(consensus) + 1):
+        result.extend(song for _, song in sorted(insertions.get(k, [])))
+        if k < len(consensus) and support[k] > threshold:
+            result.append(consensus[k])
+    return np.array(result, dtype=np.int64)
+
+
+def medoid(
+        songs: np.ndarray,
+        offsets: np.ndarray,
+        max_sample: int = 50
+) -> int:
+    """
+    The index of the setlist with the smallest total edit distance to the others
+    (among an evenly spaced sample of at most `max_sample`, for long tours).
+    """
+    sample = np.unique(np.linspace(0, len(offsets) - 2, min(max_sample, len(offsets) - 1)).astype(int))
+    setlists = [songs[offsets[i]:offsets[i + 1]] for i in sample]
+    totals = [edit_distances(s, setlists).sum() for s in setlists]
+    return int(sample[np.argmin(totals)])
+
+
+class TourAlignment:
+    """
+    The result of `align_tour`: a tour's consensus setlist and how each show departs from it.
+
+    Attributes:
+        consensus (list): The canonical setlist (song names).
+        support (np.ndarray): The proportion of shows that include each consensus song (in place).
+        event_ids (list): The shows, in order.
+        costs (np.ndarray): The number of insertions plus deletions for each show.
+        matched (np.ndarray): For every song of every show (end to end),
+            the index of its consensus position, or -1 for an insertion.
+    """
+
+    def __init__(
+            self,
+            corpus: SetlistCorpus,
+            indices: np.ndarray,
+            consensus_ids: np.ndarray,
+            matched: np.ndarray,
+            costs: np.ndarray
+    ):
+        self.event_ids = [corpus.event_ids[i] for i in indices]
+        self.consensus_ids = consensus_ids
+        self.consensus = corpus.names(consensus_ids)
+        self.songs, self.offsets = corpus.subset(indices)
+        self.song_names = corpus.song_names
+        self.matched = matched
+        self.costs = costs
+        self.support = np.bincount(matched[matched >= 0], minlength=len(consensus_ids)) / max(len(indices), 1)
+
+    def insertions(self) -> dict:
+        """
+        For each show, the songs not in the consensus, as (position in the show, song name) pairs.
+        """
+        result = {}
+        for k, event_id in enumerate(self.event_ids):
+            start, end = self.offsets[k], self.offsets[k + 1]
+            result[event_id] = [
+                (int(p), self.song_names[self.songs[start + p]])
+                for p in np.flatnonzero(self.matched[start:end] < 0)
+            ]
+        return result
+
+    def deletions(self) -> dict:
+        """
+        For each show, the consensus songs it lacks, as (consensus position, song name) pairs.
+        """
+        result = {}
+        for k, event_id in enumerate(self.event_ids):
+            present = self.matched[self.offsets[k]:self.offsets[k + 1]]
+            missing = np.setdiff1d(np.arange(len(self.consensus)), present)
+            result[event_id] = [(int(c), self.consensus[c]) for c in missing]
+        return result
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        The alignment as a table: one row per show, one column per consensus position,
+        with the (0-indexed) position in the show of each consensus song, or NaN if it was not played.
+        """
+        table = np.full((len(self.event_ids), len(self.consensus)), np.nan)
+        show = np.repeat(np.arange(len(self.event_ids)), np.diff(self.offsets))
+        position = np.arange(len(self.songs)) - self.offsets[show]
+        mask = self.matched >= 0
+        table[show[mask], self.matched[mask]] = position[mask]
+        columns = pd.MultiIndex.from_arrays([np.arange(len(self.consensus)), self.consensus])
+        return pd.DataFrame(table, index=self.event_ids, columns=columns)
+
+
+def align_tour(
+        corpus: SetlistCorpus,
+        artist_name: str,
+        tour_name: Optional[str] = None,
+        band: int = 8,
+        min_support: float = 0.5,
+        max_iter: int = 10
+) -> TourAlignment:
+    """
+    Align all the setlists on a tour (or all of an artist's setlists) to a consensus.
+
+    Args:
+        corpus (SetlistCorpus): The corpus.
+        artist_name (str): Valid artist name.
+        tour_name (str, optional): Valid tour name. Defaults to None (all the artist's shows).
+        band (int): See `align_to_consensus`.
+        min_support (float): See `update_consensus`.
+        max_iter (int): The maximum number of refinement steps.
+    """
+    indices = corpus.select(artist_name, tour_name)
+    if len(indices) == 0:
+        raise ValueError(f"No setlists for {artist_name}, {tour_name}.")
+    songs, offsets = corpus.subset(indices)
+    songs = songs.astype(np.int64)
+
+    first = medoid(songs, offsets)
+    consensus = songs[offsets[first]:offsets[first + 1]]
+    for _ in range(max_iter):
+        matched, costs = align_to_consensus(consensus, songs, offsets, band)
+        updated = update_consensus(consensus, songs, offsets, matched, min_support)
+        if np.array_equal(updated, consensus):
+            break
+        consensus = updated
+    else:
+        matched, costs = align_to_consensus(consensus, songs, offsets, band)
+
+    return TourAlignment(corpus, indices, consensus, matched, costs)
+
+
+def align_all_tours(
+        corpus: Optional[SetlistCorpus] = None,
+        **kwargs
+) -> dict:
+    """
+    Run `align_tour` for every (artist, tour) in the corpus.
+
+    Args:
+        corpus (SetlistCorpus, optional): Defaults to all artists (see `local_setlists_combine.find_artists`).
+        kwargs: Passed to `align_tour`.
+
+    Returns:
+        dict: (artist, tour) -> `TourAlignment`.
+    """
+    if corpus is None:
+        corpus = SetlistCorpus.from_artists(find_artists())
+    start = time.perf_counter()
+    pairs = sorted(set(zip(corpus.event_artists.tolist(), corpus.event_tours.tolist())))
+    result = {}
+    for artist, tour in pairs:
+        if tour < 0:
+            continue
+        key = (corpus.artists[artist], corpus.tours[tour])
+        result[key] = align_tour(corpus, *key, **kwargs)
+    print(f"Aligned {len(result)} tours in {time.perf_counter() - start:.1f}s")
+    return result
+
+
+if __name__ == "__main__":
+    corpus = SetlistCorpus.from_artists(["Coldplay"])
+    alignment = align_tour(corpus, "Coldplay", "Music of the Spheres World Tour")
+    print(alignment.consensus)
+    print(alignment.to_dataframe())
@@ -1,17 +1,42 @@
 """
 Routines for working with full setlist data and comparing these setlists across a tour.
+
+For work across many setlists, see `SetlistCorpus`:
+song names interned to integer IDs (per artist)
+and all setlists stored in one flat array,
+so that comparisons run as NumPy operations rather than Python loops over strings.
+For similarity between setlists, see `setlist_similarity` (within a tour)
+and `SetlistLSH` (near-duplicate search across the whole corpus).
 """
 
 __author__ = "Mark Gotham"
 
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 import json
+from matplotlib.collections import LineCollection
 import matplotlib.pyplot as plt
-from numpy import arange, linspace
+import numpy as np
 import pandas as pd
 from pathlib import Path
+from scipy import sparse
+import time
+from typing import Optional
+
+try:
+    from orjson import loads as json_loads  # Optional: faster json decoding for large corpora
+except ImportError:
+    json_loads = json.loads
+
+try:
+    import resource  # Not available on Windows
+except ImportError:
+    resource = None
 
 THIS_DIR = Path.cwd()
 
+SETLIST_CACHE_SIZE = 4096  # Maximum number of parsed setlists held in memory by `load_setlist`.
+
 
 def setlist_2_song_list(
         setlist_data: dict
@@ -31,22 +56,133 @@ def setlist_2_song_list(
     return songs
 
 
-def event_id_2_song_list(event_id: str = "1b94b560") -> list:
+def setlist_2_sets(
+        setlist_data: dict
+) -> list:
+    """
+    Given full setlist information,
+    return the song names set by set, keeping the set (and encore) boundaries
+    that `setlist_2_song_list` discards.
+
+    Args:
+        setlist_data (dict): The json dict for a setlist exactly as retrieved from setlist.fm.
+
+    Returns:
+        list: One `(is_encore, song_names)` tuple per set, in order.
+    """
+    sets = []
+    for top_level_item in setlist_data:
+        if "song" in top_level_item.keys():
+            sets.append((
+                bool(top_level_item.get("encore")),
+                [song["name"] for song in top_level_item["song"]]
+            ))
+    return sets
+
+
+def load_setlist(
+        event_id: str = "1b94b560",
+        cache: bool = True
+) -> list:
     """
     Retrieve full setlist data from a file at "setlists/{event_id}.json".
-    Extract the list of songs in order, and return that alone.
+
+    Parsed setlists are cached (see `SETLIST_CACHE_SIZE`), and re-read only if the file changes,
+    so repeated queries in notebooks are served from memory.
+    The returned data is shared with the cache: do not modify it.
 
     Args:
         event_id: a Valid setlist.fm event ID which corresponds to a file at "setlists/{event_id}.json".
+        cache: Use (and fill) the cache. Bulk loaders that read each setlist once
+            (e.g., to build a corpus or index) should set this to False,
+            so as not to hold thousands of raw json setlists in memory.
 
     Returns:
-        list
+        list: The json data, as retrieved from setlist.fm (see `setlistfm_events_api.process_event_ids`).
     """
     file_path = THIS_DIR / "setlists" / f"{event_id}.json"
+    if not cache:
+        return _parse_setlist(str(file_path))
+    return _read_setlist(str(file_path), file_path.stat().st_mtime_ns)
 
+
+def _parse_setlist(file_path: str) -> list:
     with open(file_path, "r") as file:
-        data = json.load(file)
-        return setlist_2_song_list(data)
+        return json.load(file)
+
+
+@lru_cache(maxsize=SETLIST_CACHE_SIZE)
+def _read_setlist(file_path: str, mtime: int) -> list:
+    return _parse_setlist(file_path)
+
+
+def event_id_2_song_list(
+        event_id: str = "1b94b560",
+        cache: bool = True
+) -> list:
+    """
+    Retrieve full setlist data from a file at "setlists/{event_id}.json".
+    Extract the list of songs in order, and return that alone.
+
+    Args:
+        event_id: a Valid setlist.fm event ID which corresponds to a file at "setlists/{event_id}.json".
+        cache: Use the cache of parsed setlists (see `load_setlist`).
+
+    Returns:
+        list
+    """
+    return setlist_2_song_list(load_setlist(event_id, cache))
+
+
+def load_events(artist_name: str) -> pd.DataFrame:
+    """
+    The events listed for an artist at "data" / f"{artist_name}_event_date_tour_venue.csv",
+    with typed columns (dates parsed from the dd-MM-YYYY format) and sorted by date.
+
+    The file is parsed once and cached (until it changes).
+    The returned data is shared with the cache: do not modify it.
+    """
+    path_to_file = THIS_DIR / "data" / f"{artist_name}_event_date_tour_venue.csv"
+    return _read_events(str(path_to_file), path_to_file.stat().st_mtime_ns)
+
+
+@lru_cache(maxsize=256)
+def _read_events(path_to_file: str, mtime: int) -> pd.DataFrame:
+    df = pd.read_csv(
+        path_to_file,
+        sep=",",
+        dtype={"event_id": str, "tour_name": str, "venue_id": str, "venue_name": str}
+    )
+    df["date"] = pd.to_datetime(df["date"], format="%d-%m-%Y", errors="coerce")
+    return df.sort_values(by="date", kind="stable").reset_index(drop=True)
+
+
+def tour_index(artist_name: str) -> dict:
+    """
+    For one artist, a dict from each tour name to the list of event IDs on that tour, in date order.
+    Built once per artist from `load_events` (and cached with it).
+    """
+    path_to_file = THIS_DIR / "data" / f"{artist_name}_event_date_tour_venue.csv"
+    return _tour_index(str(path_to_file), path_to_file.stat().st_mtime_ns)
+
+
+@lru_cache(maxsize=256)
+def _tour_index(path_to_file: str, mtime: int) -> dict:
+    df = _read_events(path_to_file, mtime)
+    index = {}
+    for event_id, tour_name in zip(df["event_id"], df["tour_name"]):
+        if pd.notna(tour_name):
+            index.setdefault(tour_name, []).append(event_id)
+    return index
+
+
+def clear_caches() -> None:
+    """
+    Clear the caches of parsed events and setlists (e.g., to free memory after a batch job).
+    """
+    _read_setlist.cache_clear()
+    _read_events.cache_clear()
+    _tour_index.cache_clear()
 
 
 def all_events_on_tour(
@@ -54,12 +190,9 @@ def all_events_on_tour(
         tour_name: str,
 ) -> list:
     """
-    Get event IDs for every event in a tour, in order.
+    Get event IDs for every event in a tour, in order (by date).
     """
-    path_to_file = THIS_DIR / "data" / f"{artist_name}_event_date_tour_venue.csv"
-    df = pd.read_csv(path_to_file, sep=",", engine="python")
-    df.sort_values(by="date")
-    return df.event_id[df.tour_name == tour_name]
+    return list(tour_index(artist_name).get(tour_name, []))
 
 
 def all_songlists_on_tour(
@@ -77,68 +210,767 @@ def all_songlists_on_tour(
     return all_songlists
 
 
+class SetlistCorpus:
+    """
+    A compact representation of many setlists.
+
+    Song names are interned to integer IDs, per artist
+    (the same name by two artists gives two IDs; see `song_names` and `song_artists`).
+    All setlists are stored end to end in one flat int32 array, `songs`,
+    with `offsets` such that setlist `i` is `songs[offsets[i]:offsets[i + 1]]`
+    (i.e., the "compressed sparse row" layout).
+    Setlist-level data is held in parallel: `event_ids`, `event_artists`, and `event_tours`
+    (indices into `artists` and `tours`; -1 for no tour).
+
+    Setlists can be added one at a time (`add_setlist`);
+    the arrays are (re)built on demand.
+    """
+
+    def __init__(self):
+        self.artists = []
+        self.tours = []
+        self.song_names = []
+        self.event_ids = []
+        self._artist_ids = {}
+        self._tour_ids = {}
+        self._song_ids = {}  # (artist index, song name) -> song ID
+        self._song_artists = []
+        self._event_artists = []
+        self._event_tours = []
+        self._songs = np.zeros(0, dtype=np.int32)
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._pending_songs = []
+        self._pending_lengths = []
+        self._pending_blocks = []  # (song IDs, lengths) arrays from `add_setlists`
+
+    def __len__(self) -> int:
+        return len(self.event_ids)
+
+    def intern_artist(self, artist: str) -> int:
+        """
+        Return the integer index for this artist, assigning a new one if needed.
+        """
+        artist_id = self._artist_ids.get(artist)
+        if artist_id is None:
+            artist_id = self._artist_ids[artist] = len(self.artists)
+            self.artists.append(artist)
+        return artist_id
+
+    def intern(
+            self,
+            artist: str,
+            song_name: str
+    ) -> int:
+        """
+        Return the integer ID for this artist's song, assigning a new one if needed.
+        """
+        artist_id = self.intern_artist(artist)
+        key = (artist_id, song_name)
+        song_id = self._song_ids.get(key)
+        if song_id is None:
+            song_id = self._song_ids[key] = len(self.song_names)
+            self.song_names.append(song_name)
+            self._song_artists.append(artist_id)
+        return song_id
+
+    def song_id(
+            self,
+            artist: str,
+            song_name: str
+    ) -> Optional[int]:
+        """
+        The ID for this artist's song, or None if it is not in the corpus.
+        """
+        artist_id = self._artist_ids.get(artist)
+        return self._song_ids.get((artist_id, song_name))
+
+    def add_setlist(
+            self,
+            artist: str,
+            event_id: str,
+            song_list: list,
+            tour_name: Optional[str] = None
+    ) -> int:
+        """
+        Add one setlist (a list of song names, as from `setlist_2_song_list`).
+
+        Returns:
+            int: The index of the new setlist.
+        """
+        ids = [self.intern(artist, name) for name in song_list]
+        self._pending_songs.extend(ids)
+        self._pending_lengths.append(len(ids))
+        self.event_ids.append(event_id)
+        self._event_artists.append(self.intern_artist(artist))
+        self._event_tours.append(self._intern_tour(tour_name))
+        return len(self.event_ids) - 1
+
+    def add_setlists(
+            self,
+            artist: str,
+            event_ids: list,
+            tour_names: list,
+            song_names: list,
+            local_ids: np.ndarray,
+            lengths: np.ndarray
+    ) -> None:
+        """
+        Add many setlists by one artist at once, already in compact form:
+        `local_ids` (all setlists end to end, with `lengths`) index into `song_names`
+        and are mapped to this corpus's IDs in one array operation.
+        See `load_corpus_parallel`.
+        """
+        remap = np.array([self.intern(artist, name) for name in song_names], dtype=np.int32)
+        self._close_pending()
+        self._pending_blocks.append((remap[local_ids], np.asarray(lengths, dtype=np.int64)))
+        artist_id = self.intern_artist(artist)
+        self.event_ids.extend(event_ids)
+        self._event_artists.extend([artist_id] * len(event_ids))
+        self._event_tours.extend(self._intern_tour(t) for t in tour_names)
+
+    def _intern_tour(self, tour_name: Optional[str]) -> int:
+        if tour_name is None or pd.isna(tour_name):
+            return -1
+        tour_id = self._tour_ids.get(tour_name)
+        if tour_id is None:
+            tour_id = self._tour_ids[tour_name] = len(self.tours)
+            self.tours.append(tour_name)
+        return tour_id
+
+    def _close_pending(self) -> None:
+        if self._pending_lengths:
+            self._pending_blocks.append((
+                np.array(self._pending_songs, dtype=np.int32),
+                np.array(self._pending_lengths, dtype=np.int64)
+            ))
+            self._pending_songs = []
+            self._pending_lengths = []
+
+    def _flush(self) -> None:
+        self._close_pending()
+        if not self._pending_blocks:
+            return
+        self._songs = np.concatenate([self._songs] + [songs for songs, _ in self._pending_blocks])
+        lengths = np.concatenate([lengths for _, lengths in self._pending_blocks])
+        self._offsets = np.concatenate([self._offsets, self._offsets[-1] + np.cumsum(lengths)])
+        self._pending_blocks = []
+
+    @property
+    def songs(self) -> np.ndarray:
+        """All song IDs of all setlists, end to end (int32)."""
+        self._flush()
+        return self._songs
+
+    @property
+    def offsets(self) -> np.ndarray:
+        """Start of each setlist in `songs`, plus the end of the last one (int64; length = number of setlists + 1)."""
+        self._flush()
+        return self._offsets
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """The number of songs in each setlist."""
+        return np.diff(self.offsets)
+
+    @property
+    def song_artists(self) -> np.ndarray:
+        """Artist index for each song ID."""
+        return np.array(self._song_artists, dtype=np.int32)
+
+    @property
+    def event_artists(self) -> np.ndarray:
+        """Artist index for each setlist."""
+        return np.array(self._event_artists, dtype=np.int32)
+
+    @property
+    def event_tours(self) -> np.ndarray:
+        """Tour index for each setlist (-1 for none)."""
+        return np.array(self._event_tours, dtype=np.int32)
+
+    def setlist(self, i: int) -> np.ndarray:
+        """
+        The song IDs of setlist `i`.
+        """
+        offsets = self.offsets
+        return self._songs[offsets[i]:offsets[i + 1]]
+
+    def names(self, song_ids) -> list:
+        """
+        Map song IDs back to song names.
+        """
+        return [self.song_names[i] for i in song_ids]
+
+    def select(
+            self,
+            artist_name: Optional[str] = None,
+            tour_name: Optional[str] = None
+    ) -> np.ndarray:
+        """
+        Indices of the setlists by this artist and/or on this tour, in the order added.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if artist_name is not None:
+            mask &= self.event_artists == self._artist_ids.get(artist_name, -2)
+        if tour_name is not None:
+            mask &= self.event_tours == self._tour_ids.get(tour_name, -2)
+        return np.flatnonzero(mask)
+
+    def subset(self, indices) -> tuple:
+        """
+        The songs and offsets for a subset of setlists (e.g., from `select`),
+        in the same CSR form as the whole corpus.
+
+        Returns:
+            tuple: (songs, offsets)
+        """
+        offsets = self.offsets
+        starts = offsets[:-1][indices]
+        lengths = offsets[1:][indices] - starts
+        sub_offsets = np.concatenate([[0], np.cumsum(lengths)])
+        # Position of every song in the flat array: each setlist's start, plus 0, 1, 2 ...
+        positions = np.repeat(starts - sub_offsets[:-1], lengths) + np.arange(sub_offsets[-1])
+        return self.songs[positions], sub_offsets
+
+    def to_song_lists(self, indices=None) -> list:
+        """
+        Back to one list of song names per setlist (as `all_songlists_on_tour`).
+        """
+        if indices is None:
+            indices = range(len(self))
+        return [self.names(self.setlist(i)) for i in indices]
+
+    @classmethod
+    def from_artists(
+            cls,
+            artist_names: list,
+    ) -> "SetlistCorpus":
+        """
+        Build a corpus from every event listed for each artist at
+        "data" / f"{artist_name}_event_date_tour_venue.csv",
+        with setlists in date order for each artist.
+        Events with no file at "setlists/{event_id}.json" are skipped.
+        """
+        corpus = cls()
+        for artist_name in artist_names:
+            df = load_events(artist_name)
+            for event_id, tour_name in zip(df["event_id"], df["tour_name"]):
+                try:
+                    song_list = event_id_2_song_list(event_id, cache=False)
+                except FileNotFoundError:
+                    continue
+                corpus.add_setlist(artist_name, event_id, song_list, tour_name)
+        return corpus
+
+
+def find_artists() -> list:
+    """
+    All artists with an event file ("data" / f"{artist_name}_event_date_tour_venue.csv").
+    """
+    suffix = "_event_date_tour_venue.csv"
+    return sorted(p.name[:-len(suffix)] for p in (THIS_DIR / "data").glob(f"*{suffix}"))
+
+
+def _parse_setlist_files(file_paths: list) -> tuple:
+    """
+    Worker for `load_corpus_parallel`:
+    parse a chunk of setlist files (all by one artist) straight to compact form.
+
+    Returns:
+        tuple: (which files were found (bool array), song names, song IDs (indexing those names), setlist lengths)
+    """
+    found = np.zeros(len(file_paths), dtype=bool)
+    names = {}
+    ids = []
+    lengths = []
+    for i, file_path in enumerate(file_paths):
+        try:
+            with open(file_path, "rb") as file:
+                data = json_loads(file.read())
+        except FileNotFoundError:
+            continue
+        found[i] = True
+        song_list = setlist_2_song_list(data)
+        ids.extend(names.setdefault(name, len(names)) for name in song_list)
+        lengths.append(len(song_list))
+    return found, list(names), np.array(ids, dtype=np.int32), np.array(lengths, dtype=np.int64)
+
+
+def load_corpus_parallel(
+        artist_names: Optional[list] = None,
+        processes: Optional[int] = None,
+        chunk_size: int = 2_000,
+        verbose: bool = True
+) -> SetlistCorpus:
+    """
+    Build a `SetlistCorpus` (as `SetlistCorpus.from_artists`)
+    with the parsing of files spread over a pool of worker processes,
+    using `orjson` (if installed) for faster decoding.
+
+    Workers return each chunk of setlists already in compact form
+    (local song IDs plus a short list of distinct names),
+    which is then mapped into the corpus in one array operation,
+    so no large intermediate dicts are passed between processes.
+
+    Args:
+        artist_names (list, optional): Artists to include. Defaults to all (see `find_artists`).
+        processes (int, optional): Number of worker processes. Defaults to the number of CPUs.
+        chunk_size (int): Number of files per task.
+        verbose (bool): Print files per second and peak memory.
+    """
+    start = time.perf_counter()
+    if artist_names is None:
+        artist_names = find_artists()
+
+    tasks = []
+    for artist_name in artist_names:
+        df = load_events(artist_name)
+        event_ids = df["event_id"].tolist()
+        tour_names = df["tour_name"].tolist()
+        for i in range(0, len(event_ids), chunk_size):
+            tasks.append((artist_name, event_ids[i:i + chunk_size], tour_names[i:i + chunk_size]))
+
+    corpus = SetlistCorpus()
+    n_files = 0
+    with ProcessPoolExecutor(processes) as executor:
+        results = executor.map(
+            _parse_setlist_files,
+            [[str(THIS_DIR / "setlists" / f"{e}.json") for e in event_ids] for _, event_ids, _ in tasks]
+        )
+        for (artist_name, event_ids, tour_names), (found, names, ids, lengths) in zip(tasks, results):
+            corpus.add_setlists(
+                artist_name,
+                [e for e, f in zip(event_ids, found) if f],
+                [t for t, f in zip(tour_names, found) if f],
+                names,
+                ids,
+                lengths
+            )
+            n_files += int(found.sum())
+
+    if verbose:
+        seconds = time.perf_counter() - start
+        print(f"Loaded {n_files} setlists in {seconds:.1f}s ({n_files / seconds:.0f} files/s)")
+        if resource is not None:  # Peak resident memory: KB on Linux
+            peak_self = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            peak_children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+            print(f"Peak memory: {peak_self:.0f} MB (main process), {peak_children:.0f} MB (largest worker)")
+    return corpus
+
+
+def position_coordinates(
+        corpus: SetlistCorpus,
+        indices
+) -> tuple:
+    """
+    The position of every song performance in a set of setlists, in "long" form:
+    one entry per song per show, computed with array operations over the corpus (no loops over setlists).
+
+    Args:
+        corpus (SetlistCorpus): The corpus.
+        indices: The setlists (shows) of interest, in order (e.g., from `SetlistCorpus.select`).
+
+    Returns:
+        tuple: Four arrays of equal length:
+            song ID, show (index into `indices`), absolute position (0-indexed),
+            and proportional position (`(position + 1) / (setlist length + 1)`).
+    """
+    songs, offsets = corpus.subset(indices)
+    lengths = np.diff(offsets)
+    shows = np.repeat(np.arange(len(lengths)), lengths)
+    positions = np.arange(len(songs)) - offsets[:-1][shows]
+    proportions = (positions + 1) / (lengths[shows] + 1)
+    return songs, shows, positions, proportions
+
+
+def tour_position_matrix(
+        corpus: SetlistCorpus,
+        artist_name: str,
+        tour_name: Optional[str] = None,
+        proportional_position: bool = True,
+        sparse_matrix: bool = False
+) -> tuple:
+    """
+    A song x show matrix of positions for one tour (or, with `tour_name=None`, all of an artist's shows).
+
+    Values are either proportional positions (in (0, 1)) or absolute positions (1-indexed: 1 = opener),
+    so that, in the sparse form, an (implicit) 0 means the song was not played.
+    In the dense form, songs not played are NaN.
+    Where a song is played more than once in a show, the first appearance is used.
+
+    Args:
+        corpus (SetlistCorpus): The corpus.
+        artist_name (str): Valid artist name.
+        tour_name (str, optional): Valid tour name. Defaults to None (all the artist's shows).
+        proportional_position (bool, optional): Proportional (default) or absolute positions.
+        sparse_matrix (bool, optional): Return a `scipy.sparse.csr_matrix` rather than a dense array.
+
+    Returns:
+        tuple: (matrix, song names (rows), event IDs (columns))
+    """
+    indices = corpus.select(artist_name, tour_name)
+    songs, shows, positions, proportions = position_coordinates(corpus, indices)
+    values = proportions if proportional_position else positions + 1
+
+    song_ids, rows = np.unique(songs, return_inverse=True)
+    n_rows, n_cols = len(song_ids), len(indices)
+    _, first = np.unique(rows.astype(np.int64) * n_cols + shows, return_index=True)
+    rows, shows, values = rows[first], shows[first], values[first]
+
+    if sparse_matrix:
+        matrix = sparse.csr_matrix((values, (rows, shows)), shape=(n_rows, n_cols))
+    else:
+        matrix = np.full((n_rows, n_cols), np.nan)
+        matrix[rows, shows] = values
+
+    return matrix, corpus.names(song_ids), [corpus.event_ids[i] for i in indices]
+
+
+def jaccard_similarity_matrix(
+        corpus: SetlistCorpus,
+        indices
+) -> np.ndarray:
+    """
+    Pairwise Jaccard similarity (shared songs / all songs, ignoring order) between setlists.
+
+    Computed in one go from the sparse show x song incidence matrix:
+    the intersections are its product with its own transpose.
+
+    Args:
+        corpus (SetlistCorpus): The corpus.
+        indices: The setlists to compare (e.g., from `SetlistCorpus.select`).
+
+    Returns:
+        np.ndarray: A square matrix of similarities in [0, 1].
+    """
+    songs, offsets = corpus.subset(indices)
+    lengths = np.diff(offsets)
+    shows = np.repeat(np.arange(len(lengths)), lengths)
+    incidence = sparse.csr_matrix(
+        (np.ones(len(songs)), (shows, songs)),
+        shape=(len(lengths), len(corpus.song_names))
+    )
+    incidence.data[:] = 1  # Songs played twice in a show count once.
+    intersection = (incidence @ incidence.T).toarray()
+    sizes = np.diag(intersection)
+    union = sizes[:, None] + sizes[None, :] - intersection
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(union > 0, intersection / union, 1.0)
+
+
+def edit_distances(
+        a: np.ndarray,
+        others: list
+) -> np.ndarray:
+    """
+    Levenshtein (edit) distance from one sequence of song IDs to each of several others.
+
+    The dynamic programming runs over the songs of `a` only,
+    with all of `others` (padded to a common length) updated together at each step.
+    Within a row, insertions are resolved with a running minimum
+    (`D[j] = j + min(t[k] - k for k <= j)`) rather than a loop over columns.
+
+    Args:
+        a (np.ndarray): One sequence of song IDs.
+        others (list): Sequences of song IDs to compare with.
+
+    Returns:
+        np.ndarray: The distance from `a` to each of `others`.
+    """
+    if not others:
+        return np.zeros(0, dtype=np.int64)
+    lengths = np.array([len(b) for b in others])
+    width = lengths.max() + 1
+    padded = np.full((len(others), width - 1), -1, dtype=np.int64)
+    for i, b in enumerate(others):
+        padded[i, :len(b)] = b
+
+    columns = np.arange(width)
+    row = np.tile(columns, (len(others), 1))
+    for i, song in enumerate(a, start=1):
+        new = np.empty_like(row)
+        new[:, 0] = i
+        new[:, 1:] = np.minimum(row[:, 1:] + 1, row[:, :-1] + (padded != song))
+        row = np.minimum.accumulate(new - columns, axis=1) + columns
+    return row[np.arange(len(others)), lengths]
+
+
+def edit_similarity_matrix(
+        corpus: SetlistCorpus,
+        indices
+) -> np.ndarray:
+    """
+    Pairwise order-aware similarity between setlists:
+    1 - (edit distance / length of the longer setlist).
+
+    Args:
+        corpus (SetlistCorpus): The corpus.
+        indices: The setlists to compare (e.g., from `SetlistCorpus.select`).
+
+    Returns:
+        np.ndarray: A square matrix of similarities in [0, 1].
+    """
+    setlists = [corpus.setlist(i) for i in indices]
+    lengths = np.array([len(s) for s in setlists])
+    n = len(setlists)
+    distances = np.zeros((n, n))
+    for i in range(n - 1):
+        distances[i, i + 1:] = edit_distances(setlists[i], setlists[i + 1:])
+    distances += distances.T
+    longer = np.maximum(lengths[:, None], lengths[None, :])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(longer > 0, 1 - distances / longer, 1.0)
+
+
+def setlist_similarity(
+        corpus: SetlistCorpus,
+        artist_name: str,
+        tour_name: Optional[str] = None,
+        order_aware: bool = False
+) -> pd.DataFrame:
+    """
+    Pairwise similarity of all the setlists on a tour (or all of an artist's setlists),
+    labelled by event ID.
+    For how much an artist varies night to night, see the first off-diagonal, e.g.,
+    `np.diag(df.values, 1).mean()`.
+
+    Args:
+        corpus (SetlistCorpus): The corpus.
+        artist_name (str): Valid artist name.
+        tour_name (str, optional): Valid tour name. Defaults to None (all the artist's shows).
+        order_aware (bool, optional): Use `edit_similarity_matrix` (order matters)
+            rather than `jaccard_similarity_matrix` (sets of songs). Defaults to False.
+    """
+    indices = corpus.select(artist_name, tour_name)
+    if order_aware:
+        matrix = edit_similarity_matrix(corpus, indices)
+    else:
+        matrix = jaccard_similarity_matrix(corpus, indices)
+    event_ids = [corpus.event_ids[i] for i in indices]
+    return pd.DataFrame(matrix, index=event_ids, columns=event_ids)
+
+
+class SetlistLSH:
+    """
+    Near-duplicate search across a whole corpus with MinHash and locality sensitive hashing (LSH).
+
+    Each setlist is summarised by a MinHash signature: for each of `num_perm` random hash functions,
+    the minimum hash over its song IDs.
+    The proportion of signature entries two setlists share estimates their Jaccard similarity.
+    Signatures are cut into `bands` bands; setlists that agree on every entry in any one band
+    share a bucket, and only those become candidates for a query.
+    With the defaults (32 bands of 4), pairs with similarity 0.5 are found ~87% of the time,
+    and pairs at 0.7 or above, more than 99.9%.
+
+    Signatures are computed with array operations in chunks,
+    so indexing 100k+ setlists takes seconds and each query then takes milliseconds.
+
+    Args:
+        num_perm (int): Number of hash functions (signature length).
+        bands (int): Number of bands. Must divide `num_perm`.
+        seed (int): For the random hash functions.
+    """
+
+    PRIME = (1 << 31) - 1  # Products with song IDs (< 2 ** 31) then fit in 64 bits.
+
+    def __init__(
+            self,
+            num_perm: int = 128,
+            bands: int = 32,
+            seed: int = 0
+    ):
+        if num_perm % bands:
+            raise ValueError("`bands` must divide `num_perm`.")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, self.PRIME, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, self.PRIME, num_perm, dtype=np.uint64)
+        self.indices = np.zeros(0, dtype=np.int64)
+        self.signatures = np.zeros((0, num_perm), dtype=np.uint64)
+        self._buckets = [{} for _ in range(bands)]
+
+    def signature(
+            self,
+            songs: np.ndarray,
+            offsets: np.ndarray,
+            chunk_size: int = 100_000
+    ) -> np.ndarray:
+        """
+        MinHash signatures for setlists in CSR form (songs and offsets).
+        Empty setlists get the maximum value throughout
+        (all the same, so `add` and `query` leave them out: they match nothing).
+        """
+        n = len(offsets) - 1
+        result = np.full((n, self.num_perm), self.PRIME, dtype=np.uint64)
+        lengths = np.diff(offsets)
+        non_empty = np.flatnonzero(lengths > 0)
+        start = 0
+        while start < len(non_empty):
+            # Chunks of whole setlists, up to about `chunk_size` songs each.
+            first = non_empty[start]
+            stop = np.searchsorted(offsets[non_empty + 1], offsets[first] + chunk_size, side="right")
+            stop = max(stop, start + 1)
+            chunk = non_empty[start:stop]
+            low, high = offsets[chunk[0]], offsets[chunk[-1] + 1]
+            hashed = (self._a[None, :] * songs[low:high, None].astype(np.uint64) + self._b[None, :]) % self.PRIME
+            result[chunk] = np.minimum.reduceat(hashed, offsets[chunk] - low, axis=0)
+            start = stop
+        return result
+
+    def _band_keys(self, signatures: np.ndarray) -> list:
+        return [
+            [row.tobytes() for row in signatures[:, band * self.rows:(band + 1) * self.rows]]
+            for band in range(self.bands)
+        ]
+
+    def add(
+            self,
+            corpus: SetlistCorpus,
+            indices=None
+    ) -> None:
+        """
+        Index setlists from the corpus
+        (by default, all of them, or, on later calls, all those added to the corpus since).
+        Empty setlists are kept in `indices` but not bucketed, so they are never candidates.
+        """
+        if indices is None:
+            start = self.indices.max() + 1 if len(self.indices) else 0
+            indices = np.arange(start, len(corpus))
+        indices = np.asarray(indices, dtype=np.int64)
+        songs, offsets = corpus.subset(indices)
+        signatures = self.signature(songs, offsets)
+        position = len(self.indices)
+        non_empty = np.diff(offsets) > 0
+        for band, keys in enumerate(self._band_keys(signatures)):
+            buckets = self._buckets[band]
+            for k, key in enumerate(keys):
+                if non_empty[k]:
+                    buckets.setdefault(key, []).append(position + k)
+        self.indices = np.concatenate([self.indices, indices])
+        self.signatures = np.concatenate([self.signatures, signatures])
+
+    def query(
+            self,
+            song_ids,
+            threshold: float = 0.5,
+            k: Optional[int] = 10
+    ) -> list:
+        """
+        Find indexed setlists similar to the given one.
+
+        Args:
+            song_ids: The song IDs of the query setlist (e.g., `corpus.setlist(i)`).
+            threshold (float): Minimum estimated Jaccard similarity.
+            k (int, optional): Maximum number of results. None for all.
+
+        Returns:
+            list: (setlist index, estimated similarity) pairs, most similar first.
+        """
+        song_ids = np.asarray(song_ids, dtype=np.int32)
+        if not len(song_ids):
+            return []
+        signature = self.signature(song_ids, np.array([0, len(song_ids)]))
+        candidates = set()
+        for band, keys in enumerate(self._band_keys(signature)):
+            candidates.update(self._buckets[band].get(keys[0], ()))
+        if not candidates:
+            return []
+        candidates = np.fromiter(candidates, dtype=np.int64)
+        estimates = (self.signatures[candidates] == signature).mean(axis=1)
+        keep = estimates >= threshold
+        candidates, estimates = candidates[keep], estimates[keep]
+        order = np.argsort(-estimates, kind="stable")[:k]
+        return [(int(self.indices[c]), float(e)) for c, e in zip(candidates[order], estimates[order])]
+
+
+def cross_tour_plot_path(
+        artist_name: str,
+        tour_name: str
+) -> Path:
+    """
+    Where `plot_cross_tour_correspondence` saves the plot for this tour.
+    """
+    return THIS_DIR / "plots" / f"{artist_name}_{tour_name}_cross_tour.pdf"
+
+
 def plot_cross_tour_correspondence(
         artist_name: str,
         tour_name: str,
-        proportional_position=True
+        proportional_position=True,
+        corpus: Optional[SetlistCorpus] = None,
+        rasterized: bool = False,
+        dpi: int = 150
 ) -> None:
     """
     Plot lists with correspondence.
 
+    All connecting lines are drawn as a single `LineCollection`,
+    and all points as one `scatter` per colour,
+    so that even tours with hundreds of shows render (and save) in seconds.
+
     Args:
         artist_name (str): Valid artist name
         tour_name (str): Valid tour name. See `all_songlists_on_tour`
         proportional_position (bool, optional): Whether to use proportional position or the index. Defaults to True.
+        corpus (SetlistCorpus, optional): A corpus including this artist. Defaults to loading one for this artist.
+        rasterized (bool, optional): Rasterise the (dense) points and lines in the saved file,
+            keeping the axes and labels as vectors. Much smaller and faster for long tours. Defaults to False.
+        dpi (int, optional): Resolution of any rasterised layers. Defaults to 150.
     """
+    if corpus is None:
+        corpus = SetlistCorpus.from_artists([artist_name])
 
-    lists = all_songlists_on_tour(artist_name, tour_name)
-    # Define the x-coordinates of the lists
-    x_coords = arange(len(lists))
+    indices = corpus.select(artist_name, tour_name)
+    songs, shows, positions, proportions = position_coordinates(corpus, indices)
+    y_values = proportions if proportional_position else positions
+    max_length = corpus.lengths[indices].max()
 
-    # Create a dictionary to store the y-coordinates of each item
-    y_coords = {}
-    for i, lst in enumerate(lists):
-        for j, item in enumerate(lst):
-            if item not in y_coords:
-                y_coords[item] = []
-            if proportional_position:
-                proportional_position_val = (j + 1) / (len(lst) + 1)
-                y_coords[item].append((i, proportional_position_val))
-            else:
-                y_coords[item].append((i, j))
+    # Group appearances by song (in order of first appearance), and by show within each song.
+    order = np.argsort(songs, kind="stable")
+    song_ids, starts, counts = np.unique(songs[order], return_index=True, return_counts=True)
+    rank = np.empty(len(song_ids), dtype=np.int64)
+    rank[np.argsort(order[starts])] = np.arange(len(song_ids))
+    x = shows[order]
+    y = y_values[order]
 
     plt.figure(figsize=(30, 10))
+    ax = plt.gca()
 
-    for item, coords in y_coords.items():
-        x = [x for x, _ in coords]
-        y = [y for _, y in coords]
-        plt.scatter(x, y, label=item)
-        for i in range(len(coords) - 1):
-            plt.plot(
-                [coords[i][0], coords[i + 1][0]],
-                [coords[i][1], coords[i + 1][1]],
-                label=None,
-                color="gray",
-                alpha=0.5
-            )
+    # Connectors: one segment between each consecutive pair of appearances of the same song, all in one artist.
+    same_song = songs[order][1:] == songs[order][:-1]
+    segments = np.stack([
+        np.column_stack([x[:-1], y[:-1]]),
+        np.column_stack([x[1:], y[1:]])
+    ], axis=1)[same_song]
+    ax.add_collection(LineCollection(segments, colors="gray", alpha=0.5, rasterized=rasterized))
+
+    # Points: songs take colours from the default cycle (as one `scatter` per song would); one `scatter` per colour.
+    colours = plt.rcParams["axes.prop_cycle"].by_key()["color"]
+    point_colours = np.repeat(rank % len(colours), counts)
+    for c, colour in enumerate(colours):
+        mask = point_colours == c
+        if mask.any():
+            ax.scatter(x[mask], y[mask], color=colour, rasterized=rasterized)
 
-    plt.xticks(x_coords, [str(i + 1) for i in range(len(lists))])  # 1-index
+    x_coords = np.arange(len(indices))
+    plt.xticks(x_coords, [str(i + 1) for i in x_coords])  # 1-index
 
     if proportional_position:
         plt.ylim(0, 1)
         plt.yticks(
-            linspace(0, 1, 11),
-            [f"{int(p * 100)}%" for p in linspace(0, 1, 11)]
+            np.linspace(0, 1, 11),
+            [f"{int(p * 100)}%" for p in np.linspace(0, 1, 11)]
         )
     else:
-        plt.ylim(-1, max(len(lst) for lst in lists))
-        plt.yticks(arange(max(len(lst) for lst in lists)),
-                   [f"Item {i + 1}" for i in range(max(len(lst) for lst in lists))])
+        plt.ylim(-1, max_length)
+        plt.yticks(np.arange(max_length),
+                   [f"Item {i + 1}" for i in range(max_length)])
 
     # plt.legend()
     plt.tight_layout()
 
-    plt.savefig(THIS_DIR / "plots" / f"{artist_name}_{tour_name}_cross_tour.pdf")
+    plt.savefig(cross_tour_plot_path(artist_name, tour_name), dpi=dpi)
 
 
 if __name__ == "__main__":
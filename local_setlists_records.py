@@ -0,0 +1,268 @@
+"""
+Compact, structure-preserving song records.
+
+`local_setlists_combine.setlist_2_song_list` keeps only song names,
+so the set and encore boundaries, covers, tape flags, and song info
+are only available by re-reading (and holding) the raw json.
+Here, instead, every song of every setlist is one record in a NumPy structured array
+(see `RECORD_DTYPE`: 21 bytes per song)
+with strings (song names, cover artists, info) interned to integer IDs.
+
+`SongRecords.from_artists` fills the records in one pass over the setlist files,
+and `memory_benchmark` compares the memory used with that of today's song lists plus raw json.
+"""
+
+__author__ = "Mark Gotham"
+
+import time
+import tracemalloc
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from local_setlists_combine import json_loads, load_events, setlist_2_song_list
+from utils import THIS_DIR
+
+
+RECORD_DTYPE = np.dtype([
+    ("song", np.int32),  # Index into `SongRecords.song_names`
+    ("event", np.int32),  # Index into `SongRecords.event_ids`
+    ("position", np.int16),  # 0-indexed across the whole setlist
+    ("set_index", np.int8),  # 0-indexed; encores count as sets
+    ("encore", np.bool_),
+    ("tape", np.bool_),
+    ("cover", np.int32),  # Index into `SongRecords.cover_artists`, or -1 for an original
+    ("info", np.int32),  # Index into `SongRecords.infos`, or -1 for none
+])
+
+
+class SongRecords:
+    """
+    Every song performance in a set of setlists, as one structured array (`records`)
+    in setlist order, with `offsets` marking where each setlist starts.
+
+    Songs are interned per artist (as in `local_setlists_combine.SetlistCorpus`);
+    cover artists and info strings are interned across the whole collection.
+    """
+
+    def __init__(self):
+        self.event_ids = []
+        self.event_artists = []
+        self.event_tours = []
+        self.song_names = []
+        self.song_artists = []
+        self.cover_artists = []
+        self.infos = []
+        self._song_ids = {}
+        self._cover_ids = {}
+        self._info_ids = {}
+        self._records = np.zeros(0, dtype=RECORD_DTYPE)
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._pending = []
+        self._pending_lengths = []
+
+    def __len__(self) -> int:
+        return len(self.event_ids)
+
+    @staticmethod
+    def _intern(
+            key,
+            ids: dict,
+            values: list
+    ) -> int:
+        i = ids.get(key)
+        if i is None:
+            i = ids[key] = len(values)
+            values.append(key)
+        return i
+
+    def add_setlist(
+            self,
+            artist: str,
+            event_id: str,
+            setlist_data: list,
+            tour_name: Optional[str] = None
+    ) -> int:
+        """
+        Add one setlist (the json data, exactly as retrieved from setlist.fm).
+
+        Returns:
+            int: The index of this setlist.
+        """
+        event = len(self.event_ids)
+        self.event_ids.append(event_id)
+        self.event_artists.append(artist)
+        self.event_tours.append(None if tour_name is None or pd.isna(tour_name) else tour_name)
+        position = 0
+        set_index = 0
+        for top_level_item in setlist_data:
+            if "song" not in top_level_item.keys():
+                continue
+            encore = bool(top_level_item.get("encore"))
+            for song in top_level_item["song"]:
+                key = (artist, song["name"])
+                song_id = self._song_ids.get(key)
+                if song_id is None:
+                    song_id = self._song_ids[key] = len(self.song_names)
+                    self.song_names.append(song["name"])
+                    self.song_artists.append(artist)
+                cover = song.get("cover")
+                info = song.get("info")
+                self._pending.append((
+                    song_id,
+                    event,
+                    position,
+                    set_index,
+                    encore,
+                    bool(song.get("tape")),
+                    -1 if cover is None else self._intern(cover.get("name"), self._cover_ids, self.cover_artists),
+                    -1 if info is None else self._intern(info, self._info_ids, self.infos)
+                ))
+                position += 1
+            set_index += 1
+        self._pending_lengths.append(position)
+        return event
+
+    def _flush(self) -> None:
+        if not self._pending_lengths:
+            return
+        self._records = np.concatenate([self._records, np.array(self._pending, dtype=RECORD_DTYPE)])
+        self._offsets = np.concatenate([
+            self._offsets, self._offsets[-1] + np.cumsum(self._pending_lengths, dtype=np.int64)
+        ])
+        self._pending = []
+        self._pending_lengths = []
+
+    @property
+    def records(self) -> np.ndarray:
+        """All the song records (see `RECORD_DTYPE`), setlist by setlist."""
+        self._flush()
+        return self._records
+
+    @property
+    def offsets(self) -> np.ndarray:
+        """Where each setlist starts in `records` (plus the total at the end)."""
+        self._flush()
+        return self._offsets
+
+    def setlist(self, i: int) -> np.ndarray:
+        """
+        The records of setlist `i`.
+        """
+        offsets = self.offsets
+        return self._records[offsets[i]:offsets[i + 1]]
+
+    def select(
+            self,
+            artist_name: Optional[str] = None,
+            tour_name: Optional[str] = None
+    ) -> np.ndarray:
+        """
+        Indices of the setlists by this artist and/or on this tour, in the order added.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if artist_name is not None:
+            mask &= np.array(self.event_artists, dtype=object) == artist_name
+        if tour_name is not None:
+            mask &= np.array(self.event_tours, dtype=object) == tour_name
+        return np.flatnonzero(mask)
+
+    def nbytes(self) -> int:
+        """
+        The size of the record and offset arrays (excluding the interned strings).
+        """
+        return self.records.nbytes + self.offsets.nbytes
+
+    def to_dataframe(self, indices=None) -> pd.DataFrame:
+        """
+        The records (of all setlists, or those at `indices`) as a DataFrame, with strings restored.
+        """
+        records = self.records
+        if indices is not None:
+            records = np.concatenate([self.setlist(i) for i in indices])
+        cover_artists = np.array(self.cover_artists + [None], dtype=object)
+        infos = np.array(self.infos + [None], dtype=object)
+        return pd.DataFrame({
+            "event_id": np.array(self.event_ids, dtype=object)[records["event"]],
+            "position": records["position"],
+            "set_index": records["set_index"],
+            "encore": records["encore"],
+            "song": np.array(self.song_names, dtype=object)[records["song"]],
+            "cover": cover_artists[records["cover"]],
+            "tape": records["tape"],
+            "info": infos[records["info"]]
+        })
+
+    @classmethod
+    def from_artists(cls, artist_names: list) -> "SongRecords":
+        """
+        Build the records in one pass over every setlist listed for each artist at
+        "data" / f"{artist_name}_event_date_tour_venue.csv", in date order.
+        Files are parsed and discarded one at a time (not kept in `load_setlist`'s cache).
+        Events with no file at "setlists/{event_id}.json" are skipped.
+        """
+        song_records = cls()
+        for artist_name in artist_names:
+            df = load_events(artist_name)
+            for event_id, tour_name in zip(df["event_id"], df["tour_name"]):
+                try:
+                    with open(THIS_DIR / "setlists" / f"{event_id}.json", "rb") as file:
+                        setlist_data = json_loads(file.read())
+                except FileNotFoundError:
+                    continue
+                song_records.add_setlist(artist_name, event_id, setlist_data, tour_name)
+        return song_records
+
+
+def memory_benchmark(artist_names: Optional[list] = None) -> pd.DataFrame:
+    """
+    Compare the memory (as traced by `tracemalloc`) and time to load these artists' setlists
+    as today's song name lists plus the raw json (needed for anything else)
+    against `SongRecords`.
+    """
+    if artist_names is None:
+        artist_names = ["Coldplay"]
+    event_ids = [e for artist_name in artist_names for e in load_events(artist_name)["event_id"]]
+
+    def measure(load):
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = load()
+        seconds = time.perf_counter() - start
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return result, size, seconds
+
+    def lists_and_json():
+        song_lists, raw = [], []
+        for event_id in event_ids:
+            path_to_file = THIS_DIR / "setlists" / f"{event_id}.json"
+            if path_to_file.exists():
+                with open(path_to_file, "rb") as file:
+                    raw.append(json_loads(file.read()))
+                song_lists.append(setlist_2_song_list(raw[-1]))
+        return song_lists, raw
+
+    def records():
+        song_records = SongRecords.from_artists(artist_names)
+        song_records.nbytes()  # Flush pending records into the array
+        return song_records
+
+    _, list_bytes, list_seconds = measure(lists_and_json)
+    song_records, record_bytes, record_seconds = measure(records)
+    df = pd.DataFrame(
+        {
+            "songs": [len(song_records.records)] * 2,
+            "MB": [list_bytes / 2 ** 20, record_bytes / 2 ** 20],
+            "seconds": [list_seconds, record_seconds]
+        },
+        index=["song lists + raw json", "SongRecords"]
+    )
+    df["bytes per song"] = df["MB"] * 2 ** 20 / df["songs"].clip(lower=1)
+    print(df)
+    return df
+
+
+if __name__ == "__main__":
+    memory_benchmark(["Coldplay"])
@@ -0,0 +1,342 @@
+"""
+How songs rotate in and out of an artist's setlists over time:
+per-song, per-month counts of the shows including each song,
+alongside the number of shows per month (so counts become shares of shows).
+
+Counts are aggregated as setlists are added (`add_setlist`, or `add_artist` for any new events),
+and kept per artist in compact columnar form (song, month, count arrays).
+Queries use a cached cumulative sum over months,
+so any window ("the last 6 months", "the year before that") is a subtraction,
+and only artists with new data are re-aggregated.
+For instance, `dropped("Coldplay", months=6)`: songs played before, but not in, the last 6 months.
+"""
+
+__author__ = "Mark Gotham"
+
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from local_setlists_combine import event_id_2_song_list, load_events
+from utils import THIS_DIR
+
+
+def month_number(date) -> int:
+    """
+    Months since year 0 (`year * 12 + month - 1`): the column index used throughout.
+    """
+    return date.year * 12 + date.month - 1
+
+
+def month_period(number: int) -> pd.Period:
+    """
+    Back from `month_number` to a `pd.Period`.
+    """
+    return pd.Period(year=number // 12, month=number % 12 + 1, freq="M")
+
+
+class SongPopularity:
+    """
+    Per-artist, per-song, per-month counts of shows including each song.
+    """
+
+    def __init__(self):
+        self.event_ids = set()
+        self._names = {}  # artist -> list of song names (index = song ID)
+        self._ids = {}  # artist -> {song name: song ID}
+        self._cells = {}  # artist -> (song IDs, months, counts), aggregated
+        self._shows = {}  # artist -> (months, counts), aggregated
+        self._pending = {}  # artist -> list of (song ID, month) not yet aggregated
+        self._pending_shows = {}  # artist -> list of months not yet aggregated
+        self._tables = {}  # artist -> cached (first month, cumulative counts, cumulative shows)
+
+    def add_setlist(
+            self,
+            artist: str,
+            event_id: str,
+            date,
+            song_list: list
+    ) -> bool:
+        """
+        Count one setlist (a list of song names, as from `event_id_2_song_list`) played on `date`.
+        A song played more than once in a show is counted once.
+
+        Returns:
+            bool: False if this event had already been added, or has no date (and so was skipped).
+        """
+        if event_id in self.event_ids or pd.isna(date):
+            return False
+        month = month_number(date)
+        ids = self._ids.setdefault(artist, {})
+        names = self._names.setdefault(artist, [])
+        pending = self._pending.setdefault(artist, [])
+        for name in dict.fromkeys(song_list):
+            song_id = ids.get(name)
+            if song_id is None:
+                song_id = ids[name] = len(names)
+                names.append(name)
+            pending.append((song_id, month))
+        self._pending_shows.setdefault(artist, []).append(month)
+        self._tables.pop(artist, None)
+        self.event_ids.add(event_id)
+        return True
+
+    def add_artist(self, artist_name: str) -> int:
+        """
+        Add any new events for an artist listed at "data" / f"{artist_name}_event_date_tour_venue.csv".
+        Events with no file at "setlists/{event_id}.json" are skipped.
+
+        Returns:
+            int: The number of events added.
+        """
+        df = load_events(artist_name)
+        count = 0
+        for event_id, date in zip(df["event_id"], df["date"]):
+            if event_id in self.event_ids:
+                continue
+            try:
+                song_list = event_id_2_song_list(event_id, cache=False)
+            except FileNotFoundError:
+                continue
+            count += self.add_setlist(artist_name, event_id, date, song_list)
+        return count
+
+    def _aggregate(self, artist: str) -> None:
+        """
+        Merge pending counts for this artist into its (song, month, count) arrays.
+        """
+        pending = self._pending.pop(artist, [])
+        pending_shows = self._pending_shows.pop(artist, [])
+        if not pending_shows:
+            return
+        songs, months, counts = self._cells.get(artist, (np.zeros(0, np.int64),) * 3)
+        new = np.array(pending, dtype=np.int64).reshape(-1, 2)
+        keys, counts = _sum_by_key(
+            np.concatenate([songs, new[:, 0]]) << 32 | np.concatenate([months, new[:, 1]]),
+            np.concatenate([counts, np.ones(len(new), dtype=np.int64)])
+        )
+        self._cells[artist] = (keys >> 32, keys & 0xFFFFFFFF, counts)
+
+        show_months, show_counts = self._shows.get(artist, (np.zeros(0, np.int64),) * 2)
+        self._shows[artist] = _sum_by_key(
+            np.concatenate([show_months, np.array(pending_shows, dtype=np.int64)]),
+            np.concatenate([show_counts, np.ones(len(pending_shows), dtype=np.int64)])
+        )
+
+    def _table(self, artist: str) -> tuple:
+        """
+        The first month, and the cumulative (over months) counts per song and shows,
+        each with a leading column of zeros, so that the total over months [a, b) is `c[b] - c[a]`.
+        """
+        self._aggregate(artist)
+        cached = self._tables.get(artist)
+        if cached is not None:
+            return cached
+        if artist not in self._shows:
+            raise KeyError(f"No setlists for {artist}.")
+        songs, months, counts = self._cells[artist]
+        show_months, show_counts = self._shows[artist]
+        first = show_months.min()
+        n_months = show_months.max() - first + 1
+
+        table = np.zeros((len(self._names[artist]), n_months + 1), dtype=np.int64)
+        np.add.at(table, (songs, months - first + 1), counts)
+        shows = np.zeros(n_months + 1, dtype=np.int64)
+        np.add.at(shows, show_months - first + 1, show_counts)
+        result = first, np.cumsum(table, axis=1), np.cumsum(shows)
+        self._tables[artist] = result
+        return result
+
+    def window(
+            self,
+            artist: str,
+            start,
+            end
+    ) -> pd.DataFrame:
+        """
+        Counts for every song between two dates (months `start` up to but not including `end`):
+        the number of shows including it, and its share of all shows in that window.
+        """
+        return self._window(artist, month_number(start), month_number(end))
+
+    def _window(
+            self,
+            artist: str,
+            start: int,
+            end: int
+    ) -> pd.DataFrame:
+        first, counts, shows = self._table(artist)
+        a = int(np.clip(start - first, 0, len(shows) - 1))
+        b = int(np.clip(end - first, 0, len(shows) - 1))
+        n_shows = shows[b] - shows[a]
+        plays = counts[:, b] - counts[:, a]
+        return pd.DataFrame(
+            {"shows": plays, "share": plays / n_shows if n_shows else np.nan},
+            index=pd.Index(self._names[artist], name="song")
+        )
+
+    def monthly(
+            self,
+            artist: str,
+            share: bool = False
+    ) -> pd.DataFrame:
+        """
+        One row per month (from the artist's first show to their last) and one column per song:
+        the number of shows including the song, or (with `share=True`) the proportion of that month's shows.
+        """
+        first, counts, shows = self._table(artist)
+        values = np.diff(counts, axis=1).T
+        index = pd.period_range(month_period(first), periods=len(shows) - 1, freq="M")
+        if share:
+            n_shows = np.diff(shows)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                values = np.where(n_shows[:, None] > 0, values / n_shows[:, None], np.nan)
+        return pd.DataFrame(values, index=index, columns=self._names[artist])
+
+    def rolling_share(
+            self,
+            artist: str,
+            months: int = 12
+    ) -> pd.DataFrame:
+        """
+        Each song's share of shows over a rolling window of `months` (ending with each month).
+        """
+        first, counts, shows = self._table(artist)
+        ends = np.arange(1, len(shows))
+        starts = np.maximum(ends - months, 0)
+        plays = (counts[:, ends] - counts[:, starts]).T
+        n_shows = shows[ends] - shows[starts]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            values = np.where(n_shows[:, None] > 0, plays / n_shows[:, None], np.nan)
+        index = pd.period_range(month_period(first), periods=len(ends), freq="M")
+        return pd.DataFrame(values, index=index, columns=self._names[artist])
+
+    def _last_month(self, artist: str) -> int:
+        first, _, shows = self._table(artist)
+        return first + len(shows) - 2
+
+    def last_played(self, artist: str) -> pd.Series:
+        """
+        The month each song was last played.
+        """
+        first, counts, _ = self._table(artist)
+        # The last column at which each song's cumulative count increased
+        last = (np.diff(counts, axis=1) > 0) * np.arange(1, counts.shape[1])
+        return pd.Series(
+            [month_period(first + m - 1) for m in last.max(axis=1)],
+            index=pd.Index(self._names[artist], name="song")
+        )
+
+    def dropped(
+            self,
+            artist: str,
+            months: int = 6,
+            lookback: Optional[int] = None,
+            as_of=None,
+            min_shows: int = 1
+    ) -> pd.DataFrame:
+        """
+        Songs played in at least `min_shows` shows before the last `months` months,
+        but not at all within them.
+
+        Args:
+            artist (str): The artist.
+            months (int): The length of the recent window.
+            lookback (int, optional): Only consider the `lookback` months before that window.
+                Defaults to None (the artist's whole history).
+            as_of (optional): The date at which the window ends. Defaults to the artist's latest show.
+            min_shows (int): The minimum number of shows before the window.
+
+        Returns:
+            pd.DataFrame: The songs dropped, with the number of shows before the window and when last played,
+            most played first.
+        """
+        end = self._last_month(artist) + 1 if as_of is None else month_number(as_of) + 1
+        recent = self._window(artist, end - months, end)
+        before = self._window(artist, 0 if lookback is None else end - months - lookback, end - months)
+        mask = (before["shows"] >= min_shows) & (recent["shows"] == 0)
+        df = pd.DataFrame({"shows_before": before["shows"][mask], "last_played": self.last_played(artist)[mask]})
+        return df.sort_values("shows_before", ascending=False, kind="stable")
+
+    def added(
+            self,
+            artist: str,
+            months: int = 6,
+            as_of=None
+    ) -> pd.DataFrame:
+        """
+        Songs played in the last `months` months and never before.
+        """
+        end = self._last_month(artist) + 1 if as_of is None else month_number(as_of) + 1
+        recent = self._window(artist, end - months, end)
+        before = self._window(artist, 0, end - months)
+        mask = (recent["shows"] > 0) & (before["shows"] == 0)
+        return recent[mask].sort_values("shows", ascending=False, kind="stable")
+
+    def save(self, path: Union[Path, str] = THIS_DIR / "data" / "popularity.npz") -> None:
+        """
+        Save the aggregated counts (and counted events) as a single compressed `.npz` file.
+        """
+        artists = sorted(self._names)
+        for artist in artists:
+            self._aggregate(artist)
+        cells = [self._cells[a] for a in artists]
+        shows = [self._shows[a] for a in artists]
+        np.savez_compressed(
+            path,
+            event_ids=np.array(sorted(self.event_ids), dtype=str),
+            artists=np.array(artists, dtype=str),
+            song_names=np.array([n for a in artists for n in self._names[a]], dtype=str),
+            song_counts=np.array([len(self._names[a]) for a in artists], dtype=np.int64),
+            cell_counts=np.array([len(c[0]) for c in cells], dtype=np.int64),
+            cells=np.concatenate([np.stack(c) for c in cells], axis=1) if cells else np.zeros((3, 0), np.int64),
+            show_counts=np.array([len(s[0]) for s in shows], dtype=np.int64),
+            shows=np.concatenate([np.stack(s) for s in shows], axis=1) if shows else np.zeros((2, 0), np.int64)
+        )
+
+    @classmethod
+    def load(cls, path: Union[Path, str] = THIS_DIR / "data" / "popularity.npz") -> "SongPopularity":
+        """
+        Load counts saved with `save`.
+        """
+        popularity = cls()
+        with np.load(path) as data:
+            popularity.event_ids = set(data["event_ids"].tolist())
+            song_ends = np.cumsum(data["song_counts"])
+            cell_ends = np.cumsum(data["cell_counts"])
+            show_ends = np.cumsum(data["show_counts"])
+            song_names = data["song_names"].tolist()
+            for i, artist in enumerate(data["artists"].tolist()):
+                names = song_names[song_ends[i] - data["song_counts"][i]:song_ends[i]]
+                popularity._names[artist] = names
+                popularity._ids[artist] = {name: j for j, name in enumerate(names)}
+                cells = data["cells"][:, cell_ends[i] - data["cell_counts"][i]:cell_ends[i]]
+                popularity._cells[artist] = tuple(cells)
+                shows = data["shows"][:, show_ends[i] - data["show_counts"][i]:show_ends[i]]
+                popularity._shows[artist] = tuple(shows)
+        return popularity
+
+
+def _sum_by_key(
+        keys: np.ndarray,
+        values: np.ndarray
+) -> tuple:
+    """
+    Sum `values` over equal `keys`.
+
+    Returns:
+        tuple: (the distinct keys, sorted; the sums).
+    """
+    order = np.argsort(keys, kind="stable")
+    keys, values = keys[order], values[order]
+    starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]])) if len(keys) else np.zeros(0, int)
+    return keys[starts], np.add.reduceat(values, starts) if len(starts) else values[:0]
+
+
+if __name__ == "__main__":
+    popularity = SongPopularity()
+    popularity.add_artist("Coldplay")
+    print(popularity.dropped("Coldplay", months=6))
+    print(popularity.added("Coldplay", months=6))
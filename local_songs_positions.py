@@ -0,0 +1,101 @@
+"""
+Where in the setlist each song is played:
+per-song position statistics for an artist (or one tour),
+computed in one pass over all the song records (`local_setlists_records.SongRecords`)
+with grouped NumPy operations rather than loops over setlists.
+
+For each song:
+- `plays`: the number of performances; `show_share`: the proportion of shows including it;
+- `opener`, `closer`, `encore`: the probability, given that it is played,
+  of it opening the show, closing the show (the very last song), and being played in an encore;
+- `mean_position`, `var_position`: the mean and variance of its relative position
+  (0 for the first song of a show, 1 for the last);
+- `entropy`: the entropy (in bits) of its relative position, in `bins` equal bins:
+  0 for a song always in the same place; `log2(bins)` for one played anywhere.
+"""
+
+__author__ = "Mark Gotham"
+
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from local_setlists_records import SongRecords
+
+
+def position_statistics(
+        song_records: SongRecords,
+        artist_name: Optional[str] = None,
+        tour_name: Optional[str] = None,
+        bins: int = 10
+) -> pd.DataFrame:
+    """
+    Per-song position statistics (see the module docstring) for the setlists of this artist and/or tour.
+
+    Args:
+        song_records (SongRecords): The song records.
+        artist_name (str, optional): Valid artist name. Defaults to None (all artists).
+        tour_name (str, optional): Valid tour name. Defaults to None (all tours).
+        bins (int): The number of position bins for the entropy.
+
+    Returns:
+        pd.DataFrame: One row per song, most played first.
+    """
+    indices = song_records.select(artist_name, tour_name)
+    records = song_records.records
+    offsets = song_records.offsets
+    lengths = np.diff(offsets)
+
+    selected = np.zeros(len(song_records), dtype=bool)
+    selected[indices] = True
+    records = records[selected[records["event"]]]
+
+    songs = records["song"].astype(np.int64)
+    length = lengths[records["event"]]
+    relative = np.where(length > 1, records["position"] / np.maximum(length - 1, 1), 0.0)
+
+    n_songs = len(song_records.song_names)
+    plays = np.bincount(songs, minlength=n_songs)
+    played = np.flatnonzero(plays)
+
+    def rate(mask):
+        return np.bincount(songs, weights=mask, minlength=n_songs)[played] / plays[played]
+
+    # Shows including each song (counting repeats within a show once)
+    keys = np.sort(records["event"].astype(np.int64) * n_songs + songs)
+    first = np.concatenate([[True], keys[1:] != keys[:-1]]) if len(keys) else keys.astype(bool)
+    show_counts = np.bincount(keys[first] % n_songs, minlength=n_songs)
+
+    mean = np.bincount(songs, weights=relative, minlength=n_songs)[played] / plays[played]
+    mean_square = np.bincount(songs, weights=relative ** 2, minlength=n_songs)[played] / plays[played]
+
+    # Entropy: a sparse song x bin histogram, normalised by row
+    position_bins = np.minimum((relative * bins).astype(np.int64), bins - 1)
+    histogram = sparse.coo_matrix(
+        (np.ones(len(songs)), (songs, position_bins)), shape=(n_songs, bins)
+    ).tocsr()
+    histogram.sum_duplicates()
+    rows = np.repeat(np.arange(n_songs), np.diff(histogram.indptr))
+    p = histogram.data / plays[rows]
+    entropy = np.bincount(rows, weights=-p * np.log2(p), minlength=n_songs)[played]
+
+    df = pd.DataFrame({
+        "artist": np.array(song_records.song_artists, dtype=object)[played],
+        "song": np.array(song_records.song_names, dtype=object)[played],
+        "plays": plays[played],
+        "show_share": show_counts[played] / max(len(indices), 1),
+        "opener": rate(records["position"] == 0),
+        "closer": rate(records["position"] == length - 1),
+        "encore": rate(records["encore"]),
+        "mean_position": mean,
+        "var_position": np.maximum(mean_square - mean ** 2, 0),
+        "entropy": entropy
+    })
+    return df.sort_values("plays", ascending=False, kind="stable").reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    song_records = SongRecords.from_artists(["Coldplay"])
+    print(position_statistics(song_records, "Coldplay"))
@@ -0,0 +1,272 @@
+"""
+Cross-source song entity resolution:
+one stable song ID per (artist, work), linked to each source that knows about it:
+- "setlistfm": the song names used in `setlists/*.json`;
+- "spotify": track IDs found by `spotify_tracks_api.py` (stored in "data" / f"{artist}_tracks.csv");
+- "musicbrainz": recording IDs found by `musicbrainz.py`.
+
+A "work" is identified by its normalised title (`local_titles_match.normalise_title`),
+so "Fix You", "Fix You (acoustic)", and "Fix You - Live" are the same song.
+Medleys ("Song A / Song B") are split (`local_titles_match.split_medley`), and each part linked to its own song.
+Titles that do not normalise to a known work are matched against the artist's existing works
+using a trigram blocking index (`local_titles_match.TitleIndex`),
+so each new title is scored against a handful of candidates only
+and matching scales (near-)linearly with the size of the corpus.
+
+Everything is stored in an SQLite database (`utils.SONGS_DB`).
+IDs are assigned once and never renumbered,
+and the setlists already ingested are recorded,
+so new setlists are added incrementally with `ingest_setlists`.
+"""
+
+__author__ = "Mark Gotham"
+
+from pathlib import Path
+import sqlite3
+from typing import Optional, Union
+
+import pandas as pd
+
+from local_setlists_combine import event_id_2_song_list, load_events
+from local_titles_match import TitleIndex, normalise_title, split_medley
+from musicbrainz import batch_song_metadata_from_recording
+from utils import SONGS_DB, THIS_DIR
+
+
+SOURCES = ("setlistfm", "spotify", "musicbrainz")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS songs (
+    song_id INTEGER PRIMARY KEY,
+    artist TEXT NOT NULL,
+    work_key TEXT NOT NULL,
+    name TEXT,
+    UNIQUE (artist, work_key)
+);
+CREATE TABLE IF NOT EXISTS links (
+    song_id INTEGER NOT NULL REFERENCES songs (song_id),
+    source TEXT NOT NULL,
+    external_id TEXT NOT NULL,
+    name TEXT,
+    PRIMARY KEY (source, external_id, song_id)
+);
+CREATE INDEX IF NOT EXISTS links_song ON links (song_id, source);
+CREATE TABLE IF NOT EXISTS ingested_events (
+    event_id TEXT PRIMARY KEY,
+    artist TEXT
+);
+"""
+
+
+class SongRegistry:
+    """
+    The registry of songs and their links to each source.
+
+    Args:
+        db_path: Where to store the registry. Use ":memory:" for a throwaway registry.
+        threshold (float): Minimum title similarity for a fuzzy match to an existing work.
+            See `local_titles_match.TitleIndex`.
+    """
+
+    def __init__(
+            self,
+            db_path: Union[Path, str] = SONGS_DB,
+            threshold: float = 0.9
+    ):
+        self.connection = sqlite3.connect(db_path)
+        self.connection.executescript(SCHEMA)
+        self.index = TitleIndex(threshold=threshold)
+        for song_id, artist, work_key in self.connection.execute("SELECT song_id, artist, work_key FROM songs"):
+            self.index.add(artist, work_key, song_id)
+
+    def resolve(
+            self,
+            artist: str,
+            title: str,
+            create: bool = True
+    ) -> Optional[int]:
+        """
+        Return the song ID for this artist and title,
+        creating a new song if this title matches no known work (and `create` is True).
+        """
+        match = self.index.lookup(artist, title)
+        if match is not None:
+            return match[1]
+        if not create:
+            return None
+
+        work_key = normalise_title(title)
+        cursor = self.connection.execute(
+            "INSERT INTO songs (artist, work_key, name) VALUES (?, ?, ?)",
+            (artist, work_key, title)
+        )
+        self.index.add(artist, work_key, cursor.lastrowid)
+        return cursor.lastrowid
+
+    def link(
+            self,
+            song_id: int,
+            source: str,
+            external_id: str,
+            name: Optional[str] = None
+    ) -> None:
+        """
+        Record that `external_id` in `source` (one of `SOURCES`) refers to this song.
+        """
+        if source not in SOURCES:
+            raise ValueError(f"Unknown source {source}. Choose from {SOURCES}.")
+        self.connection.execute(
+            "INSERT OR IGNORE INTO links VALUES (?, ?, ?, ?)",
+            (song_id, source, str(external_id), name)
+        )
+
+    def links(self, song_id: int) -> dict:
+        """
+        All links for a song, as a dict from source to list of `(external_id, name)` pairs.
+        """
+        result = {source: [] for source in SOURCES}
+        for source, external_id, name in self.connection.execute(
+                "SELECT source, external_id, name FROM links WHERE song_id = ?", (song_id,)
+        ):
+            result[source].append((external_id, name))
+        return result
+
+    def find(
+            self,
+            source: str,
+            external_id: str
+    ) -> list:
+        """
+        The song ID(s) linked to this ID in this source
+        (setlist.fm song names may be shared by different artists' songs).
+        """
+        return [row[0] for row in self.connection.execute(
+            "SELECT song_id FROM links WHERE source = ? AND external_id = ?", (source, str(external_id))
+        )]
+
+    def songs(self, artist: Optional[str] = None) -> pd.DataFrame:
+        """
+        The songs in the registry (optionally for one artist only)
+        with one column of linked IDs per source.
+        """
+        query = (
+            "SELECT s.song_id, s.artist, s.name, "
+            + ", ".join(
+                f"(SELECT GROUP_CONCAT(external_id, '|') FROM links l "
+                f"WHERE l.song_id = s.song_id AND l.source = '{source}') AS {source}"
+                for source in SOURCES
+            )
+            + " FROM songs s"
+        )
+        params = ()
+        if artist is not None:
+            query += " WHERE s.artist = ?"
+            params = (artist,)
+        return pd.read_sql_query(query + " ORDER BY s.song_id", self.connection, params=params)
+
+    def commit(self) -> None:
+        self.connection.commit()
+
+    def ingest_setlists(
+            self,
+            artist: str,
+            event_ids: Optional[list] = None
+    ) -> int:
+        """
+        Add the songs from setlists (`setlists/{event_id}.json`) by this artist,
+        skipping any events already ingested.
+
+        Args:
+            artist (str): The artist, as used in file names.
+            event_ids (list, optional): The events to add.
+                Defaults to all those listed in "data" / f"{artist}_event_date_tour_venue.csv".
+
+        Returns:
+            int: The number of newly ingested events.
+        """
+        if event_ids is None:
+            event_ids = load_events(artist)["event_id"].tolist()
+
+        done = {row[0] for row in self.connection.execute(
+            "SELECT event_id FROM ingested_events WHERE artist = ?", (artist,)
+        )}
+
+        count = 0
+        for event_id in event_ids:
+            if event_id in done:
+                continue
+            try:
+                songs = event_id_2_song_list(event_id, cache=False)
+            except FileNotFoundError:
+                print(f"No setlist file for event {event_id}")
+                continue
+            for name in songs:
+                for part in split_medley(name):
+                    self.link(self.resolve(artist, part), "setlistfm", name, name)
+            self.connection.execute("INSERT INTO ingested_events VALUES (?, ?)", (event_id, artist))
+            done.add(event_id)
+            count += 1
+
+        self.commit()
+        return count
+
+    def ingest_spotify_tracks(self, artist: str) -> int:
+        """
+        Link the Spotify tracks already found for this artist ("data" / f"{artist}_tracks.csv").
+        Each part of a medley is linked to the song for that part (see the "part" column).
+        Medleys in files written before that column was added are skipped:
+        their one track ID cannot be attributed to a part.
+
+        Returns:
+            int: The number of tracks linked.
+        """
+        df = pd.read_csv(THIS_DIR / "data" / f"{artist}_tracks.csv", dtype=str)
+        df = df[df["id"].notna()]
+        parts = df["part"].fillna(df["track"]) if "part" in df.columns else df["track"]
+        count = 0
+        for part, found, track_id in zip(parts, df["found"], df["id"]):
+            if len(split_medley(part)) > 1:
+                print(f"Skipping medley with no part given: {part}")
+                continue
+            self.link(self.resolve(artist, part), "spotify", track_id, found)
+            count += 1
+        self.commit()
+        return count
+
+    def ingest_musicbrainz(
+            self,
+            artist: str,
+            offline: bool = False
+    ) -> int:
+        """
+        Look up MusicBrainz recordings for this artist's songs that have none linked yet
+        (see `musicbrainz.batch_song_metadata_from_recording`; cached, rate-limited, or `offline`).
+
+        Returns:
+            int: The number of songs newly linked.
+        """
+        unlinked = self.connection.execute(
+            "SELECT song_id, name FROM songs s WHERE artist = ? AND NOT EXISTS "
+            "(SELECT 1 FROM links l WHERE l.song_id = s.song_id AND l.source = 'musicbrainz')",
+            (artist,)
+        ).fetchall()
+
+        results = batch_song_metadata_from_recording(
+            [(name, artist, None) for _, name in unlinked],
+            offline=offline
+        )
+
+        count = 0
+        for (song_id, _), result in zip(unlinked, results):
+            if "recording" in result:
+                recording = result["recording"]
+                self.link(song_id, "musicbrainz", recording["id"], recording.get("title"))
+                count += 1
+        self.commit()
+        return count
+
+
+if __name__ == "__main__":
+    registry = SongRegistry()
+    print(registry.ingest_setlists("Coldplay"), "new setlists")
+    print(registry.songs("Coldplay"))
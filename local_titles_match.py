@@ -0,0 +1,312 @@
+"""
+Offline normalisation and fuzzy matching for song titles as they appear on setlist.fm.
+
+Setlist.fm song names come in many variants of the same underlying song:
+"Fix You (acoustic)", "Fix you", "Fix You - Live", medleys, typos, and so on.
+Sending each of those verbatim to an API (e.g., `spotify_tracks_api.search_track`)
+costs one call per variant, and the decorated variants often miss.
+
+Here, we:
+1. normalise titles (case, accents, punctuation, bracketed performance notes like "(acoustic)", ...);
+2. index the normalised titles already resolved for each artist by character trigrams ("blocking"), so that
+3. any new title is compared (string similarity) against a handful of candidates only, not every known title.
+
+Medleys ("Song A / Song B") are split, and each part matched separately.
+Only titles with no sufficiently close match need go to the API.
+Exact (normalised) matches are a dictionary lookup,
+so this scales to millions of song rows (most of which are repeats).
+"""
+
+__author__ = "Mark Gotham"
+
+from collections import Counter
+from difflib import SequenceMatcher
+from pathlib import Path
+import re
+from typing import Optional, Union
+import unicodedata
+
+import pandas as pd
+
+from utils import THIS_DIR
+
+
+PERFORMANCE_NOTES = [
+    "acoustic",
+    "demo",
+    "edit",
+    "extended",
+    "instrumental",
+    "intro",
+    "live",
+    "mix",
+    "outro",
+    "piano",
+    "remaster",
+    "remastered",
+    "reprise",
+    "snippet",
+    "version",
+]
+
+_BRACKETS = re.compile(r"\([^)]*\)|\[[^\]]*\]")
+_DASH_NOTE = re.compile(r"\s+-\s+[^-]*\b(" + "|".join(PERFORMANCE_NOTES) + r")\b[^-]*$")
+_FEATURING = re.compile(r"\s+(feat\.?|ft\.?|featuring)\s.*$")
+_NON_ALPHANUMERIC = re.compile(r"[^0-9a-z ]+")
+_WHITESPACE = re.compile(r"\s+")
+_MEDLEY = re.compile(r"\s+/\s+|\s+>\s+")
+
+MIN_FUZZY_LENGTH = 6  # Shorter (normalised) titles only match exactly: "clock" is not "clocks".
+
+
+def normalise_title(title: str) -> str:
+    """
+    Normalise a song title for comparison:
+    strip accents and case,
+    remove bracketed notes ("(acoustic)", "[live]"),
+    trailing performance notes ("- Live at Wembley", "- 2000 Remaster"),
+    featured artists,
+    and all punctuation.
+
+    If that leaves nothing (e.g., for "(Intro)"),
+    fall back to the case-folded title with only punctuation removed.
+
+    >>> normalise_title("Fix You (acoustic)")
+    'fix you'
+    >>> normalise_title("Yellow - Live in Buenos Aires")
+    'yellow'
+    >>> normalise_title("Don't Panic")
+    'dont panic'
+    """
+    text = unicodedata.normalize("NFKD", title)
+    text = "".join(c for c in text if not unicodedata.combining(c)).casefold()
+    text = text.replace("&", " and ").replace("'", "").replace("’", "")
+
+    stripped = _BRACKETS.sub(" ", text)
+    stripped = _DASH_NOTE.sub("", stripped)
+    stripped = _FEATURING.sub("", stripped)
+    stripped = _WHITESPACE.sub(" ", _NON_ALPHANUMERIC.sub(" ", stripped)).strip()
+    if stripped:
+        return stripped
+
+    return _WHITESPACE.sub(" ", _NON_ALPHANUMERIC.sub(" ", text)).strip()
+
+
+def split_medley(title: str) -> list:
+    """
+    Split a medley title like "Song A / Song B" into its parts.
+    Titles that are not medleys are returned as a list of one.
+    """
+    return [part.strip() for part in _MEDLEY.split(title) if part.strip()]
+
+
+def trigrams(text: str) -> set:
+    """
+    Return the set of character trigrams of a (normalised) string,
+    padded so that word starts and ends count too.
+    """
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def title_similarity(a: str, b: str) -> float:
+    """
+    Similarity of two normalised titles in the range [0, 1] (1 = identical).
+    """
+    return SequenceMatcher(None, a, b).ratio()
+
+
+class TitleIndex:
+    """
+    Per-artist index of already-resolved song titles.
+
+    Each entry maps a normalised title to a value
+    (for instance, the `(found_name, track_id)` pair returned by `spotify_tracks_api.search_track`).
+    Lookups proceed in three stages, stopping at the first success:
+    1. exact match on the normalised title (a dict lookup);
+    2. trigram blocking: candidates sharing enough trigrams with the query ...
+    3. ... scored by `title_similarity` and accepted above `threshold`.
+    Titles shorter than `min_length` (either the query or the candidate) only match exactly,
+    since one character makes a bigger difference there (e.g., "Clock" and "Clocks").
+
+    Args:
+        threshold (float): Minimum similarity for a fuzzy match. Defaults to 0.85.
+        min_dice (float): Minimum trigram overlap (Dice coefficient) for a title to be considered a candidate.
+        max_candidates (int): Maximum number of candidates scored per lookup.
+        min_length (int): Minimum length of normalised titles for a fuzzy match.
+    """
+
+    def __init__(
+            self,
+            threshold: float = 0.85,
+            min_dice: float = 0.5,
+            max_candidates: int = 10,
+            min_length: int = MIN_FUZZY_LENGTH
+    ):
+        self.threshold = threshold
+        self.min_length = min_length
+        self.min_dice = min_dice
+        self.max_candidates = max_candidates
+        self._titles = {}  # artist -> list of normalised titles
+        self._values = {}  # artist -> {normalised title: value}
+        self._grams = {}  # artist -> {trigram: list of indices into `_titles[artist]`}
+        self._sizes = {}  # artist -> number of trigrams for each of `_titles[artist]`
+
+    def __len__(self) -> int:
+        return sum(len(titles) for titles in self._titles.values())
+
+    def add(
+            self,
+            artist: str,
+            title: str,
+            value=None
+    ) -> str:
+        """
+        Add a resolved title (and its value) for this artist.
+        Adding a title that normalises to one already indexed overwrites the value.
+
+        Returns:
+            str: the normalised title used as the key.
+        """
+        key = normalise_title(title)
+        values = self._values.setdefault(artist, {})
+        if key not in values:
+            titles = self._titles.setdefault(artist, [])
+            grams = self._grams.setdefault(artist, {})
+            key_grams = trigrams(key)
+            for gram in key_grams:
+                grams.setdefault(gram, []).append(len(titles))
+            titles.append(key)
+            self._sizes.setdefault(artist, []).append(len(key_grams))
+        values[key] = value
+        return key
+
+    def candidates(
+            self,
+            artist: str,
+            title: str
+    ) -> list:
+        """
+        Return the normalised titles for this artist which share enough trigrams with `title`
+        to be worth scoring, best first.
+        """
+        key = normalise_title(title)
+        grams = self._grams.get(artist)
+        if not grams:
+            return []
+
+        query_grams = trigrams(key)
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(grams.get(gram, ()))
+
+        titles = self._titles[artist]
+        sizes = self._sizes[artist]
+        scored = []
+        for i, n_shared in shared.items():
+            dice = 2 * n_shared / (len(query_grams) + sizes[i])
+            if dice >= self.min_dice:
+                scored.append((dice, titles[i]))
+        scored.sort(reverse=True)
+        return [t for _, t in scored[:self.max_candidates]]
+
+    def lookup(
+            self,
+            artist: str,
+            title: str
+    ) -> Optional[tuple]:
+        """
+        Find the indexed title that this one is a variant of (if any).
+
+        Returns:
+            Optional[tuple]: `(normalised_title, value, similarity)` for the best match,
+            or None if nothing is close enough (i.e., this is a genuinely new title).
+        """
+        key = normalise_title(title)
+        values = self._values.get(artist, {})
+        if key in values:
+            return key, values[key], 1.0
+
+        best = None
+        if len(key) < self.min_length:
+            return best
+        for candidate in self.candidates(artist, title):
+            if len(candidate) < self.min_length:
+                continue
+            score = title_similarity(key, candidate)
+            if score >= self.threshold and (best is None or score > best[2]):
+                best = (candidate, values[candidate], score)
+        return best
+
+    def lookup_medley(
+            self,
+            artist: str,
+            title: str
+    ) -> list:
+        """
+        Look up each part of a medley (see `split_medley`) separately.
+
+        Returns:
+            list: One `(part, match)` pair per part, where `match` is as returned by `lookup`.
+            A title that is not a medley gives a list of one.
+        """
+        return [(part, self.lookup(artist, part)) for part in split_medley(title)]
+
+    def cluster(
+            self,
+            artist: str,
+            titles: list
+    ) -> dict:
+        """
+        Group variant titles for one artist.
+        Titles matching something already indexed join that cluster;
+        others start a new cluster (and are added to the index with value None).
+        Each part of a medley is clustered separately.
+
+        Returns:
+            dict: Mapping from each input title to its cluster's normalised title
+            (for a medley, those of its parts, joined by " / ").
+        """
+        clusters = {}
+        for title in dict.fromkeys(titles):
+            keys = []
+            for part, match in self.lookup_medley(artist, title):
+                keys.append(self.add(artist, part) if match is None else match[0])
+            clusters[title] = " / ".join(keys)
+        return clusters
+
+    @classmethod
+    def from_track_csv(
+            cls,
+            artists: list,
+            data_dir: Union[Path, str] = THIS_DIR / "data",
+            **kwargs
+    ) -> "TitleIndex":
+        """
+        Build an index from the tracks already resolved by `spotify_tracks_api.get_track_data`,
+        i.e., the files at "data" / f"{artist}_tracks.csv" (columns "track", "part", "found", "id").
+        Each row is indexed under its "part" (one part of a medley, or the whole title):
+        files written before that column was added are indexed under "track".
+        Rows with no track ID (titles not found) are skipped, so that they are searched for again.
+        Artists with no such file are skipped.
+        """
+        index = cls(**kwargs)
+        for artist in artists:
+            path = Path(data_dir) / f"{artist}_tracks.csv"
+            if not path.exists():
+                continue
+            df = pd.read_csv(path, dtype=str)
+            parts = df["part"].fillna(df["track"]) if "part" in df.columns else df["track"]
+            for part, found, track_id in zip(parts, df["found"], df["id"]):
+                if pd.isna(track_id):
+                    continue
+                index.add(artist, part, (found, track_id))
+        return index
+
+
+if __name__ == "__main__":
+    demo = TitleIndex()
+    demo.add("Coldplay", "Fix You", ("Fix You", "7LVHVU3tWfcxj5aiPFEW4Q"))
+    for variant in ["Fix You (acoustic)", "fix you", "Fix Yuo", "Fix You - Live", "Yellow"]:
+        print(variant, "->", demo.lookup("Coldplay", variant))
+    print(demo.lookup_medley("Coldplay", "Fix You / Yellow"))
@@ -0,0 +1,135 @@
+"""
+Batch generation of cross-tour correspondence plots
+(`local_setlists_combine.plot_cross_tour_correspondence`)
+for every tour of every artist with a file at "data" / f"{artist}_event_date_tour_venue.csv".
+
+The setlist corpus is loaded once (in parallel: `local_setlists_combine.load_corpus_parallel`)
+and shared with a pool of worker processes,
+each rendering with the non-interactive "Agg" backend.
+Plots that are already up to date (newer than the event csv and every setlist on the tour) are skipped.
+"""
+
+__author__ = "Mark Gotham"
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import time
+from typing import Optional
+
+import matplotlib
+
+from local_setlists_combine import (
+    SetlistCorpus,
+    cross_tour_plot_path,
+    find_artists,
+    load_corpus_parallel,
+    plot_cross_tour_correspondence
+)
+from utils import THIS_DIR
+
+EVENTS_SUFFIX = "_event_date_tour_venue.csv"
+
+_corpus = None  # Set in each worker by `_init_worker`.
+
+
+def find_tours(corpus: SetlistCorpus) -> list:
+    """
+    All (artist, tour) pairs with at least one setlist in the corpus.
+    """
+    pairs = set(zip(corpus.event_artists.tolist(), corpus.event_tours.tolist()))
+    return sorted(
+        (corpus.artists[artist], corpus.tours[tour])
+        for artist, tour in pairs
+        if tour >= 0
+    )
+
+
+def is_up_to_date(
+        corpus: SetlistCorpus,
+        artist_name: str,
+        tour_name: str
+) -> bool:
+    """
+    True if the plot for this tour exists and is newer than all of its inputs.
+    """
+    output = cross_tour_plot_path(artist_name, tour_name)
+    if not output.exists():
+        return False
+    inputs = [THIS_DIR / "data" / f"{artist_name}{EVENTS_SUFFIX}"]
+    inputs += [THIS_DIR / "setlists" / f"{corpus.event_ids[i]}.json" for i in corpus.select(artist_name, tour_name)]
+    latest_input = max(p.stat().st_mtime for p in inputs if p.exists())
+    return output.stat().st_mtime >= latest_input
+
+
+def _init_worker(corpus: SetlistCorpus) -> None:
+    global _corpus
+    matplotlib.use("Agg")
+    _corpus = corpus
+
+
+def _plot_one(
+        artist_name: str,
+        tour_name: str,
+        proportional_position: bool,
+        rasterized: bool
+) -> tuple:
+    import matplotlib.pyplot as plt
+    start = time.perf_counter()
+    plot_cross_tour_correspondence(
+        artist_name,
+        tour_name,
+        proportional_position=proportional_position,
+        corpus=_corpus,
+        rasterized=rasterized
+    )
+    plt.close("all")
+    return artist_name, tour_name, time.perf_counter() - start
+
+
+def plot_all_tours(
+        artist_names: Optional[list] = None,
+        processes: Optional[int] = None,
+        force: bool = False,
+        proportional_position: bool = True,
+        rasterized: bool = True
+) -> list:
+    """
+    Render the cross-tour plot for every tour, in parallel.
+
+    Args:
+        artist_names (list, optional): Artists to include. Defaults to all (see `local_setlists_combine.find_artists`).
+        processes (int, optional): Number of worker processes. Defaults to the number of CPUs.
+        force (bool): Re-render even plots that are up to date.
+        proportional_position (bool): Passed to `plot_cross_tour_correspondence`.
+        rasterized (bool): Passed to `plot_cross_tour_correspondence`.
+
+    Returns:
+        list: (artist, tour, seconds) for each plot rendered.
+    """
+    start = time.perf_counter()
+    if artist_names is None:
+        artist_names = find_artists()
+    corpus = load_corpus_parallel(artist_names, processes)
+    print(f"Loaded {len(corpus)} setlists for {len(artist_names)} artists in {time.perf_counter() - start:.1f}s")
+
+    tours = find_tours(corpus)
+    to_do = [pair for pair in tours if force or not is_up_to_date(corpus, *pair)]
+    print(f"{len(to_do)} of {len(tours)} tours to plot ({len(tours) - len(to_do)} up to date)")
+
+    timings = []
+    with ProcessPoolExecutor(processes, initializer=_init_worker, initargs=(corpus,)) as executor:
+        futures = [executor.submit(_plot_one, *pair, proportional_position, rasterized) for pair in to_do]
+        for future in as_completed(futures):
+            try:
+                artist_name, tour_name, seconds = future.result()
+            except Exception as e:
+                print(f"Error occurred: {e}")
+                continue
+            print(f"{artist_name}, {tour_name}: {seconds:.1f}s")
+            timings.append((artist_name, tour_name, seconds))
+
+    print(f"Done: {len(timings)} plots in {time.perf_counter() - start:.1f}s")
+    return timings
+
+
+if __name__ == "__main__":
+    plot_all_tours()
@@ -0,0 +1,237 @@
+"""
+An incremental index of song-to-song transitions across the setlist corpus:
+which song follows which, how often, per artist and per tour.
+
+Each setlist is read as a sequence of tokens:
+a marker at the start of each set (`SET_START`, or `ENCORE_START` for an encore),
+the songs of that set, and finally `END`.
+So, for instance, transitions from `SET_START` give the openers, and transitions to `END`, the closers.
+
+Counts are kept per (artist, tour) and served as `scipy.sparse` matrices
+(rows = from, columns = to; indexed by each artist's song IDs).
+Setlists can be added at any time (the events already counted are recorded and skipped),
+and the index saved to / loaded from disk, so queries never need to rescan the corpus.
+"""
+
+__author__ = "Mark Gotham"
+
+from collections import Counter
+import json
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from local_setlists_combine import load_events, load_setlist, setlist_2_sets
+from utils import THIS_DIR
+
+SET_START = "<set start>"
+ENCORE_START = "<encore start>"
+END = "<end>"
+MARKERS = (SET_START, ENCORE_START, END)
+
+
+class TransitionIndex:
+    """
+    Song-to-song transition counts per artist and per tour.
+    """
+
+    def __init__(self):
+        self.event_ids = set()
+        self._names = {}  # artist -> list of song names (index = song ID; the markers first)
+        self._ids = {}  # artist -> {song name: song ID}
+        self._counts = {}  # (artist, tour) -> Counter of (from ID, to ID)
+        self._matrices = {}  # (artist, tour) -> cached csr_matrix
+
+    def _intern(
+            self,
+            artist: str,
+            song_name: str
+    ) -> int:
+        ids = self._ids.get(artist)
+        if ids is None:
+            ids = self._ids[artist] = {marker: i for i, marker in enumerate(MARKERS)}
+            self._names[artist] = list(MARKERS)
+        song_id = ids.get(song_name)
+        if song_id is None:
+            song_id = ids[song_name] = len(self._names[artist])
+            self._names[artist].append(song_name)
+        return song_id
+
+    def add_setlist(
+            self,
+            artist: str,
+            event_id: str,
+            setlist_data: list,
+            tour_name: Optional[str] = None
+    ) -> bool:
+        """
+        Count the transitions in one setlist (the json data, as from `load_setlist`).
+
+        Returns:
+            bool: False if this event had already been added (and so was skipped).
+        """
+        if event_id in self.event_ids:
+            return False
+        if tour_name is not None and pd.isna(tour_name):
+            tour_name = None
+
+        tokens = []
+        for is_encore, song_names in setlist_2_sets(setlist_data):
+            tokens.append(ENCORE_START if is_encore else SET_START)
+            tokens.extend(song_names)
+        if not tokens:
+            return False
+        tokens.append(END)
+
+        ids = [self._intern(artist, t) for t in tokens]
+        counts = self._counts.setdefault((artist, tour_name), Counter())
+        counts.update(zip(ids[:-1], ids[1:]))
+        self._matrices.pop((artist, tour_name), None)
+        self._matrices.pop((artist, "*"), None)
+        self.event_ids.add(event_id)
+        return True
+
+    def add_artist(self, artist_name: str) -> int:
+        """
+        Add any new events for an artist listed at "data" / f"{artist_name}_event_date_tour_venue.csv".
+        Events with no file at "setlists/{event_id}.json" are skipped.
+
+        Returns:
+            int: The number of events added.
+        """
+        df = load_events(artist_name)
+        count = 0
+        for event_id, tour_name in zip(df["event_id"], df["tour_name"]):
+            if event_id in self.event_ids:
+                continue
+            try:
+                setlist_data = load_setlist(event_id, cache=False)
+            except FileNotFoundError:
+                continue
+            count += self.add_setlist(artist_name, event_id, setlist_data, tour_name)
+        return count
+
+    def song_names(self, artist: str) -> list:
+        """
+        The song names (and markers) for this artist, in the order of the matrix rows and columns.
+        """
+        return list(self._names.get(artist, MARKERS))
+
+    def matrix(
+            self,
+            artist: str,
+            tour_name: Optional[str] = None
+    ) -> sparse.csr_matrix:
+        """
+        Transition counts for one tour, or (with `tour_name=None`) all of an artist's setlists,
+        as a square sparse matrix over the artist's song IDs (from row to column).
+        """
+        key = (artist, "*" if tour_name is None else tour_name)
+        n = len(self._names.get(artist, MARKERS))
+        cached = self._matrices.get(key)
+        if cached is not None and cached.shape[0] == n:
+            return cached
+
+        if tour_name is None:
+            counters = [c for (a, _), c in self._counts.items() if a == artist]
+        else:
+            counters = [self._counts.get((artist, tour_name), Counter())]
+        pairs = Counter()
+        for c in counters:
+            pairs.update(c)
+
+        rows = np.fromiter((p[0] for p in pairs), dtype=np.int32, count=len(pairs))
+        columns = np.fromiter((p[1] for p in pairs), dtype=np.int32, count=len(pairs))
+        values = np.fromiter(pairs.values(), dtype=np.int64, count=len(pairs))
+        result = sparse.csr_matrix((values, (rows, columns)), shape=(n, n))
+        self._matrices[key] = result
+        return result
+
+    def next_songs(
+            self,
+            artist: str,
+            song_name: str,
+            k: int = 5,
+            tour_name: Optional[str] = None
+    ) -> list:
+        """
+        The `k` most likely songs (or markers) to follow this one (use `SET_START` for openers).
+
+        Returns:
+            list: (song name, probability) pairs, most likely first.
+        """
+        song_id = self._ids.get(artist, {}).get(song_name)
+        if song_id is None:
+            return []
+        row = self.matrix(artist, tour_name).getrow(song_id)
+        total = row.sum()
+        if total == 0:
+            return []
+        order = np.argsort(-row.data, kind="stable")[:k]
+        names = self._names[artist]
+        return [(names[row.indices[i]], float(row.data[i] / total)) for i in order]
+
+    def probability(
+            self,
+            artist: str,
+            from_song: str,
+            to_song: str,
+            tour_name: Optional[str] = None
+    ) -> float:
+        """
+        The probability that `to_song` directly follows `from_song`.
+        """
+        ids = self._ids.get(artist, {})
+        if from_song not in ids or to_song not in ids:
+            return 0.0
+        row = self.matrix(artist, tour_name).getrow(ids[from_song])
+        total = row.sum()
+        return float(row[0, ids[to_song]] / total) if total else 0.0
+
+    def save(self, path: Union[Path, str] = THIS_DIR / "data" / "transitions.json") -> None:
+        """
+        Save the index (song names, counted events, and counts in coordinate form) as json.
+        """
+        data = {
+            "event_ids": sorted(self.event_ids),
+            "songs": self._names,
+            "counts": [
+                {
+                    "artist": artist,
+                    "tour": tour_name,
+                    "from": [p[0] for p in counts],
+                    "to": [p[1] for p in counts],
+                    "count": list(counts.values())
+                }
+                for (artist, tour_name), counts in self._counts.items()
+            ]
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+    @classmethod
+    def load(cls, path: Union[Path, str] = THIS_DIR / "data" / "transitions.json") -> "TransitionIndex":
+        """
+        Load an index saved with `save`.
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls()
+        index.event_ids = set(data["event_ids"])
+        index._names = data["songs"]
+        index._ids = {artist: {name: i for i, name in enumerate(names)} for artist, names in data["songs"].items()}
+        for entry in data["counts"]:
+            index._counts[(entry["artist"], entry["tour"])] = Counter(
+                dict(zip(zip(entry["from"], entry["to"]), entry["count"]))
+            )
+        return index
+
+
+if __name__ == "__main__":
+    transitions = TransitionIndex()
+    transitions.add_artist("Coldplay")
+    print(transitions.next_songs("Coldplay", SET_START))
+    print(transitions.next_songs("Coldplay", "Yellow"))
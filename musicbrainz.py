@@ -1,13 +1,34 @@
 """
 Script to request information from the MusicBrainz API
 with a valid pair of endpoint and query.
+
+MusicBrainz allows about 1 request per second
+(see https://musicbrainz.org/doc/MusicBrainz_API/Rate_Limiting).
+All requests here go through a shared `RateLimiter` to keep to that.
+For many songs, use `batch_song_metadata_from_recording`
+which combines compatible lookups into one query.
+For corpus-scale work, use `offline=True` to query a local copy of the MusicBrainz data dump instead
+(see `musicbrainz_dump.py`).
+
+API results are memoised (see `LookupCache`), so
+repeated queries for the same (title, artist, album) never go back to the network,
+and concurrent requests for the same query share one call.
 """
 
 __author__ = "Mark Gotham"
 
+from collections import OrderedDict
+from pathlib import Path
 import requests
 import json
-from utils import MUSICBRAINZ_BASE_URL
+import sqlite3
+import threading
+import time
+from typing import Callable, Optional, Union
+
+from local_titles_match import MIN_FUZZY_LENGTH, normalise_title, title_similarity
+from musicbrainz_dump import lookup_recording
+from utils import MUSICBRAINZ_BASE_URL, MUSICBRAINZ_CACHE_DB
 from utils import MUSICBRAINZ_HEADER  # NB: enter yours there
 
 ENDPOINT = f"{MUSICBRAINZ_BASE_URL}/recording"
@@ -16,11 +37,190 @@ headers = {
     "User-Agent": MUSICBRAINZ_HEADER
 }
 
+MAX_LIMIT = 100  # Maximum results per search request allowed by the API.
+NO_MATCH = "No matching recording found."
+
+
+class RateLimiter:
+    """
+    Schedule calls so that successive calls start at least `interval` seconds apart.
+
+    Scheduling is by a monotonic clock, start-to-start,
+    so time spent on the request itself counts towards the interval
+    (i.e., we keep to the limit exactly rather than sleeping a full interval on top of each request).
+    Thread-safe: concurrent callers queue up in turn.
+
+    Args:
+        interval (float): Minimum seconds between the start of successive calls. Defaults to 1.0.
+    """
+
+    def __init__(self, interval: float = 1.0):
+        self.interval = interval
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        """
+        Block until the next slot is free, and claim it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now < self._next_slot:
+                time.sleep(self._next_slot - now)
+                now = self._next_slot
+            self._next_slot = now + self.interval
+
+
+rate_limiter = RateLimiter()
+
+
+class LookupCache:
+    """
+    Memoise lookups: an in-memory LRU in front of a persistent SQLite store.
+
+    - Hits are served from memory, or failing that from disk (and promoted to memory).
+    - Negative results ("No matching recording found.") are cached too, but expire after `negative_ttl` seconds
+    (MusicBrainz is edited constantly, so today's miss may be tomorrow's match).
+    - Failed requests (network errors etc.) are never cached.
+    - Single-flight: if a lookup for a key is already in progress,
+    other callers for that key wait for it and share the result rather than making their own call.
+
+    Cached result dicts are shared between callers; treat them as read-only.
+
+    Args:
+        db_path: Where to store the persistent cache. None for memory only.
+        max_memory (int): Maximum number of results held in memory.
+        negative_ttl (float): Seconds for which a negative result remains valid. Defaults to 30 days.
+    """
+
+    def __init__(
+            self,
+            db_path: Optional[Union[Path, str]] = MUSICBRAINZ_CACHE_DB,
+            max_memory: int = 10_000,
+            negative_ttl: float = 30 * 24 * 60 * 60
+    ):
+        self.max_memory = max_memory
+        self.negative_ttl = negative_ttl
+        self._memory = OrderedDict()  # key -> (result, time stored)
+        self._in_flight = {}  # key -> threading.Event
+        self._lock = threading.Lock()
+        self._connection = None
+        if db_path is not None:
+            self._connection = sqlite3.connect(db_path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS lookups (key TEXT PRIMARY KEY, result TEXT, stored REAL)"
+            )
+            self._connection.commit()
+
+    @staticmethod
+    def make_key(*query) -> str:
+        return json.dumps(query)
+
+    def _is_fresh(self, result: dict, stored: float) -> bool:
+        if result.get("error") == NO_MATCH:
+            return time.time() - stored < self.negative_ttl
+        return True
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        Return the cached result for this key, or None if there is no (fresh) entry.
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None and self._connection is not None:
+                row = self._connection.execute(
+                    "SELECT result, stored FROM lookups WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    entry = (json.loads(row[0]), row[1])
+                    self._remember(key, entry)
+            if entry is None or not self._is_fresh(*entry):
+                return None
+            self._memory.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: str, result: dict) -> None:
+        """
+        Store a result, unless it is a failed request.
+        """
+        if "error" in result and result["error"] != NO_MATCH:
+            return
+        entry = (result, time.time())
+        with self._lock:
+            self._remember(key, entry)
+            if self._connection is not None:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO lookups VALUES (?, ?, ?)",
+                    (key, json.dumps(result), entry[1])
+                )
+                self._connection.commit()
+
+    def _remember(self, key: str, entry: tuple) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory:
+            self._memory.popitem(last=False)
+
+    def get_or_fetch(
+            self,
+            key: str,
+            fetch: Callable[[], dict]
+    ) -> dict:
+        """
+        Return the cached result for this key, or call `fetch()` to get (and cache) it.
+        Only one `fetch` per key runs at a time: concurrent callers wait for it and re-use the result.
+        """
+        while True:
+            result = self.get(key)
+            if result is not None:
+                return result
+            with self._lock:
+                event = self._in_flight.get(key)
+                if event is None:
+                    event = threading.Event()
+                    self._in_flight[key] = event
+                    leader = True
+                else:
+                    leader = False
+            if not leader:
+                event.wait()
+                # The leader's result is now cached (or, if it failed, we try again ourselves).
+                result = self.get(key)
+                if result is not None:
+                    return result
+                continue
+            try:
+                result = fetch()
+                self.put(key, result)
+                return result
+            finally:
+                with self._lock:
+                    del self._in_flight[key]
+                event.set()
+
+
+_cache = None
+_cache_lock = threading.Lock()  # So that concurrent first calls to `get_cache` share one cache
+
+
+def get_cache() -> LookupCache:
+    """
+    The module's shared `LookupCache`, created (at `utils.MUSICBRAINZ_CACHE_DB`) on first use.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LookupCache()
+    return _cache
+
 
 def song_metadata_from_recording(
         song_title: str = None,
         artist: str = None,
         album_title: str = None,
+        offline: bool = False,
+        use_cache: bool = True,
 ) -> dict:
     """
     Fetches structured metadata from MusicBrainz API using the "recording" endpoint.
@@ -31,9 +231,18 @@ def song_metadata_from_recording(
         song_title (str): Song title. Optional
         artist (str): Artist name. Optional
         album_title (str): Album title. Optional
+        offline (bool): If True, answer from the local dump store (see `musicbrainz_dump.py`)
+            rather than the API. Same return form; no network access.
+        use_cache (bool): If True (default), serve repeated queries from the module's `LookupCache`,
+            and share in-flight requests for the same query.
     Returns:
         dict
     """
+    if use_cache and not offline:
+        return get_cache().get_or_fetch(
+            LookupCache.make_key(song_title, artist, album_title),
+            lambda: song_metadata_from_recording(song_title, artist, album_title, use_cache=False)
+        )
 
     query = []
     if song_title: query.append(f"title:{song_title}")
@@ -54,7 +263,17 @@ def song_metadata_from_recording(
         "offset": 0
     }
 
+    if offline:
+        recording = lookup_recording(song_title, artist, album_title)
+        if recording is None:
+            return {"error": NO_MATCH}
+        return {
+            "recording": recording,
+            "search_query": params["query"]
+        }
+
     try:
+        rate_limiter.wait()
         response = requests.get(ENDPOINT, params=params, headers=headers)
         response.raise_for_status()
         data = response.json()
@@ -65,12 +284,148 @@ def song_metadata_from_recording(
                 "recording": data["recordings"][0],
                 "search_query": params["query"]
             }
-        return {"error": "No matching recording found."}
+        return {"error": NO_MATCH}
 
     except requests.exceptions.RequestException as e:
         return {"error": f"API request failed: {str(e)}"}
 
 
+def lucene_phrase(text: str) -> str:
+    """
+    Quote a string as a Lucene phrase, escaping any backslashes and quotation marks within it.
+    """
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _match_recording(
+        song_title: str,
+        recordings: list,
+        threshold: float = 0.85
+) -> Optional[dict]:
+    """
+    Pick the recording (if any) among combined search results that corresponds to this song title:
+    the first (highest scoring) with the same normalised title or, failing that,
+    the most similar above `threshold` (for titles of at least `MIN_FUZZY_LENGTH` characters).
+    """
+    key = normalise_title(song_title)
+    best, best_score = None, threshold
+    for recording in recordings:
+        candidate = normalise_title(recording.get("title", ""))
+        if candidate == key:
+            return recording
+        if min(len(key), len(candidate)) < MIN_FUZZY_LENGTH:
+            continue
+        score = title_similarity(key, candidate)
+        if score >= best_score:
+            best, best_score = recording, score
+    return best
+
+
+def batch_song_metadata_from_recording(
+        songs: list,
+        max_batch: int = 10,
+        fallback: bool = True,
+        offline: bool = False,
+        use_cache: bool = True
+) -> list:
+    """
+    Resolve many songs against the MusicBrainz "recording" endpoint at the maximum permitted rate.
+
+    Songs by the same artist (and from the same album, if given) are "compatible":
+    they are combined into one OR-joined Lucene query, e.g.,
+    `(recording:"Yellow" OR recording:"Fix You") AND artist:"Coldplay"`
+    with up to `max_batch` titles per request.
+    Each returned recording is then mapped back to the input title it matches.
+    Songs without a title or artist, and any singleton groups,
+    are sent as single queries via `song_metadata_from_recording`.
+
+    All requests share the module's `rate_limiter`,
+    so the total time is (more or less exactly) one second per request.
+    Duplicate inputs, and (with `use_cache`) songs already looked up, cost nothing extra.
+
+    Args:
+        songs (list): A list of (song_title, artist, album_title) tuples. Any item except one may be None.
+        max_batch (int): Maximum number of titles to combine in one query.
+            Keep this modest: the API returns at most 100 recordings per request,
+            and popular titles have many (live) recordings each.
+        fallback (bool): If True, songs that a combined query does not resolve
+            are retried individually with `song_metadata_from_recording`.
+        offline (bool): If True, resolve each song from the local dump store instead
+            (no combining or rate limiting needed).
+        use_cache (bool): If True (default), serve previously resolved songs from the module's `LookupCache`
+            and add new results to it.
+
+    Returns:
+        list: One result dict per input, in the same order and of the same form as `song_metadata_from_recording`.
+    """
+    if offline:
+        return [song_metadata_from_recording(*song, offline=True) for song in songs]
+
+    unique_songs = list(dict.fromkeys(tuple(song) for song in songs))
+
+    groups = {}
+    results = {}
+    for song in unique_songs:
+        song_title, artist, album_title = song
+        if use_cache:
+            cached = get_cache().get(LookupCache.make_key(*song))
+            if cached is not None:
+                results[song] = cached
+                continue
+        if song_title and artist:
+            groups.setdefault((artist, album_title), []).append(song)
+        else:
+            results[song] = None  # single query below
+
+    for (artist, album_title), group in groups.items():
+        for start in range(0, len(group), max_batch):
+            batch = group[start:start + max_batch]
+            if len(batch) == 1:
+                results[batch[0]] = None
+                continue
+
+            titles = " OR ".join(f"recording:{lucene_phrase(s[0])}" for s in batch)
+            query = f"({titles}) AND artist:{lucene_phrase(artist)}"
+            if album_title:
+                query += f" AND release:{lucene_phrase(album_title)}"
+
+            params = {
+                "query": query,
+                "fmt": "json",
+                "limit": MAX_LIMIT,
+                "offset": 0
+            }
+            try:
+                rate_limiter.wait()
+                response = requests.get(ENDPOINT, params=params, headers=headers)
+                response.raise_for_status()
+                recordings = response.json().get("recordings", [])
+            except requests.exceptions.RequestException as e:
+                print(f"API request failed: {e}")
+                recordings = []
+
+            for song in batch:
+                recording = _match_recording(song[0], recordings)
+                if recording is None:
+                    results[song] = None
+                else:
+                    results[song] = {
+                        "recording": recording,
+                        "search_query": query
+                    }
+                    if use_cache:
+                        get_cache().put(LookupCache.make_key(*song), results[song])
+
+    for song, result in results.items():
+        if result is None:
+            if fallback or not (song[0] and song[1]):
+                results[song] = song_metadata_from_recording(*song, use_cache=use_cache)
+            else:
+                results[song] = {"error": NO_MATCH}
+
+    return [results[tuple(song)] for song in songs]
+
+
 if __name__ == "__main__":
     # Demo:
     result = song_metadata_from_recording(
@@ -0,0 +1,279 @@
+"""
+Offline MusicBrainz: ingest the MusicBrainz JSON data dump into a compact, indexed local store,
+and query that store in place of the API.
+
+At 1 request per second, even perfectly scheduled API calls
+(see `musicbrainz.batch_song_metadata_from_recording`)
+take more than two days for 200k unique songs.
+Instead, download the JSON dumps for recordings and releases from
+https://data.metabrainz.org/pub/musicbrainz/data/json-dumps/
+(`recording.tar.xz` and `release.tar.xz`), and run `ingest_dump` once.
+The archives are streamed (never unpacked to disk or held in memory)
+into an SQLite database with:
+- `recordings`: id, title, length, and the artist credit (as json);
+- `recording_artists`: normalised credited artist names, for lookup;
+- `releases`: id, title, date, status;
+- `recording_releases`: which recordings appear on which releases.
+
+Lookups (`lookup_recording`, or `musicbrainz.song_metadata_from_recording(..., offline=True)`)
+are then single indexed queries on normalised titles (see `local_titles_match.normalise_title`)
+and return the same form as the API search.
+"""
+
+__author__ = "Mark Gotham"
+
+from functools import lru_cache
+import json
+from pathlib import Path
+import sqlite3
+import tarfile
+from typing import Iterator, Optional, Union
+
+from local_titles_match import normalise_title
+from utils import MUSICBRAINZ_DUMP_DB
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recordings (
+    id TEXT PRIMARY KEY,
+    title TEXT,
+    title_key TEXT,
+    length INTEGER,
+    artist_credit TEXT
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS recording_artists (
+    artist_key TEXT,
+    recording_id TEXT
+);
+CREATE TABLE IF NOT EXISTS releases (
+    id TEXT PRIMARY KEY,
+    title TEXT,
+    title_key TEXT,
+    date TEXT,
+    status TEXT
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS recording_releases (
+    recording_id TEXT,
+    release_id TEXT
+);
+"""
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS recordings_title_key ON recordings (title_key);
+CREATE INDEX IF NOT EXISTS recording_artists_key ON recording_artists (artist_key, recording_id);
+CREATE INDEX IF NOT EXISTS recording_artists_recording ON recording_artists (recording_id);
+CREATE INDEX IF NOT EXISTS releases_title_key ON releases (title_key);
+CREATE INDEX IF NOT EXISTS recording_releases_recording ON recording_releases (recording_id, release_id);
+CREATE INDEX IF NOT EXISTS recording_releases_release ON recording_releases (release_id);
+"""
+
+
+def iter_dump_entities(
+        path: Union[Path, str],
+        entity: str
+) -> Iterator[dict]:
+    """
+    Stream entities (one json object per line) from a MusicBrainz json dump.
+
+    Args:
+        path: Either the dump archive as downloaded (e.g., `recording.tar.xz`),
+            which is read as a stream and never unpacked,
+            or the already extracted file (e.g., `mbdump/recording`).
+        entity (str): The entity type, e.g., "recording" or "release".
+            This is the name of the member to read within an archive.
+    """
+    path = Path(path)
+    if tarfile.is_tarfile(path):
+        with tarfile.open(path, mode="r|*") as archive:
+            for member in archive:
+                if member.name.split("/")[-1] == entity and member.isfile():
+                    for line in archive.extractfile(member):
+                        yield json.loads(line)
+                    return
+        raise ValueError(f"No `{entity}` file found in {path}")
+
+    with open(path, "rb") as file:
+        for line in file:
+            yield json.loads(line)
+
+
+def artist_credit_name(artist_credit: list) -> str:
+    """
+    The full credited name as displayed, e.g., "Coldplay & Rihanna".
+    """
+    return "".join(credit.get("name", "") + credit.get("joinphrase", "") for credit in artist_credit)
+
+
+def _recording_rows(recording: dict) -> tuple:
+    credit = recording.get("artist-credit", [])
+    artist_keys = {normalise_title(artist_credit_name(credit))}
+    for c in credit:
+        artist_keys.add(normalise_title(c.get("name", "")))
+        artist_keys.add(normalise_title(c.get("artist", {}).get("name", "")))
+    artist_keys.discard("")
+    row = (
+        recording["id"],
+        recording.get("title", ""),
+        normalise_title(recording.get("title", "")),
+        recording.get("length"),
+        json.dumps(credit, separators=(",", ":"))
+    )
+    return row, [(k, recording["id"]) for k in artist_keys]
+
+
+def _release_rows(release: dict) -> tuple:
+    row = (
+        release["id"],
+        release.get("title", ""),
+        normalise_title(release.get("title", "")),
+        release.get("date"),
+        release.get("status")
+    )
+    recording_ids = {
+        track["recording"]["id"]
+        for medium in release.get("media", [])
+        for track in medium.get("tracks", [])
+        if "recording" in track
+    }
+    return row, [(recording_id, release["id"]) for recording_id in recording_ids]
+
+
+def ingest_dump(
+        recording_dump: Optional[Union[Path, str]] = None,
+        release_dump: Optional[Union[Path, str]] = None,
+        db_path: Union[Path, str] = MUSICBRAINZ_DUMP_DB,
+        batch_size: int = 10_000
+) -> None:
+    """
+    Stream the recording and/or release dumps into the local store at `db_path`.
+    Either dump can be ingested (or re-ingested, replacing the old data) on its own.
+
+    Rows are written in batches of `batch_size` with journaling off
+    (a failed ingest is simply re-run), and indexes are built once at the end.
+    """
+    connection = sqlite3.connect(db_path)
+    connection.executescript(SCHEMA)
+    connection.execute("PRAGMA journal_mode = OFF")
+    connection.execute("PRAGMA synchronous = OFF")
+
+    def write(entities, to_rows, main_sql, link_sql):
+        rows, links = [], []
+        count = 0
+        for entity in entities:
+            row, entity_links = to_rows(entity)
+            rows.append(row)
+            links.extend(entity_links)
+            count += 1
+            if len(rows) >= batch_size:
+                connection.executemany(main_sql, rows)
+                connection.executemany(link_sql, links)
+                connection.commit()
+                rows, links = [], []
+                print(f"... {count} done")
+        connection.executemany(main_sql, rows)
+        connection.executemany(link_sql, links)
+        connection.commit()
+        return count
+
+    if recording_dump is not None:
+        connection.execute("DELETE FROM recording_artists")
+        n = write(
+            iter_dump_entities(recording_dump, "recording"),
+            _recording_rows,
+            "INSERT OR REPLACE INTO recordings VALUES (?, ?, ?, ?, ?)",
+            "INSERT INTO recording_artists VALUES (?, ?)"
+        )
+        print(f"Ingested {n} recordings.")
+
+    if release_dump is not None:
+        connection.execute("DELETE FROM recording_releases")
+        n = write(
+            iter_dump_entities(release_dump, "release"),
+            _release_rows,
+            "INSERT OR REPLACE INTO releases VALUES (?, ?, ?, ?, ?)",
+            "INSERT INTO recording_releases VALUES (?, ?)"
+        )
+        print(f"Ingested {n} releases.")
+
+    print("Indexing ...")
+    connection.executescript(INDEXES)
+    connection.execute("ANALYZE")
+    connection.close()
+    open_store.cache_clear()
+
+
+@lru_cache(maxsize=None)
+def open_store(db_path: Union[Path, str] = MUSICBRAINZ_DUMP_DB) -> sqlite3.Connection:
+    """
+    Open (once) a read-only connection to the local store.
+    """
+    if not Path(db_path).exists():
+        raise FileNotFoundError(f"No local MusicBrainz store at {db_path}. See `ingest_dump`.")
+    connection = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+    connection.row_factory = sqlite3.Row
+    return connection
+
+
+def lookup_recording(
+        song_title: Optional[str] = None,
+        artist: Optional[str] = None,
+        album_title: Optional[str] = None,
+        db_path: Union[Path, str] = MUSICBRAINZ_DUMP_DB
+) -> Optional[dict]:
+    """
+    Find a recording in the local store by (normalised) song title, artist, and album title,
+    or any combination.
+    Where several recordings match, prefer the one on the most releases
+    (usually the canonical studio recording rather than a live or demo one).
+
+    Returns:
+        Optional[dict]: The recording in the same form as the API search results
+        ("id", "title", "length", "artist-credit", "releases"), or None if there is no match.
+    """
+    conditions, params, joins = [], [], []
+    if song_title:
+        conditions.append("r.title_key = ?")
+        params.append(normalise_title(song_title))
+    if artist:
+        joins.append("JOIN recording_artists a ON a.recording_id = r.id")
+        conditions.append("a.artist_key = ?")
+        params.append(normalise_title(artist))
+    if album_title:
+        joins.append("JOIN recording_releases rr ON rr.recording_id = r.id JOIN releases rel ON rel.id = rr.release_id")
+        conditions.append("rel.title_key = ?")
+        params.append(normalise_title(album_title))
+    if not conditions:
+        raise ValueError("No query argument specified. Must have at least one.")
+
+    connection = open_store(db_path)
+    sql = (
+        f"SELECT DISTINCT r.id, r.title, r.length, r.artist_credit FROM recordings r {' '.join(joins)} "
+        f"WHERE {' AND '.join(conditions)} "
+        "ORDER BY (SELECT COUNT(*) FROM recording_releases c WHERE c.recording_id = r.id) DESC, r.id "
+        "LIMIT 1"
+    )
+    row = connection.execute(sql, params).fetchone()
+    if row is None:
+        return None
+
+    releases = connection.execute(
+        "SELECT rel.id, rel.title, rel.date, rel.status FROM recording_releases rr "
+        "JOIN releases rel ON rel.id = rr.release_id WHERE rr.recording_id = ? ORDER BY rel.date",
+        (row["id"],)
+    ).fetchall()
+
+    return {
+        "id": row["id"],
+        "title": row["title"],
+        "length": row["length"],
+        "artist-credit": json.loads(row["artist_credit"]),
+        "releases": [dict(release) for release in releases]
+    }
+
+
+if __name__ == "__main__":
+    ingest_dump(
+        recording_dump=Path("recording.tar.xz"),
+        release_dump=Path("release.tar.xz")
+    )
+    print(lookup_recording("Yellow", "Coldplay", "Parachutes"))
@@ -19,12 +19,23 @@ Note:
 __author__ = ["Mark Gotham", "Shujin Gan"]
 
 from bs4 import BeautifulSoup
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import hashlib
 import io
+import json
+import multiprocessing
+import os
+from pathlib import Path
 
 from PyPDF2 import PdfReader
 import re
 import spacy  # NB: also install `spacy.cli.download("en_core_web_sm")`
-from typing import Optional
+from tempfile import NamedTemporaryFile, SpooledTemporaryFile
+import threading
+import time
+from typing import BinaryIO, Iterable, Iterator, Optional, Union
+from urllib.error import HTTPError
+from urllib.parse import urlparse
 from urllib.request import Request, urlopen
 
 # Constants
@@ -32,6 +43,55 @@ from utils import HEADERS, PARSER, THIS_DIR
 
 TARGET_URL = "https://songexploder.net/episodes"
 
+RAW_DIR = THIS_DIR / "song_exploder" / "raw"
+FILTERED_DIR = THIS_DIR / "song_exploder" / "filtered"
+MANIFEST_PATH = THIS_DIR / "song_exploder" / "manifest.json"  # See `load_manifest`
+
+CHUNK_SIZE = 2 ** 16  # Bytes read at a time when downloading
+SPOOL_SIZE = 2 ** 22  # PDFs larger than this are spooled to disk, see `iter_transcript_pages`
+
+NLP_MODEL = "en_core_web_sm"
+NLP_DISABLE = ["tok2vec", "tagger", "parser", "attribute_ruler", "lemmatizer", "ner"]  # Only the tokenizer is used
+
+_nlp = None  # Loaded once, on first use, by `get_nlp`.
+_special_cases = None  # The tokenizer's exceptions (`nlp.tokenizer.rules`), see `fast_filter`.
+
+EXCLUDE_PREVIOUS = ["box", "drum", "skill", "sun"]  # "skill set" ...
+EXCLUDE_NEXT = ["against", "her", "him", "in", "it", "of", "off", "out", "up", "the"]
+
+# For `fast_filter`: a lowercase word including "set", and the words (or punctuation) either side.
+# Anything else next to these words (hyphens, apostrophes, digits, repeated spaces ...) is left to spaCy,
+# as are words that spaCy's tokenizer exceptions split, e.g. "itll" ("it", "ll"): see `_special_cases`.
+SET_WORD = re.compile(r"[A-Za-z]*set[A-Za-z]*")
+PREVIOUS_WORD = re.compile(r"(?:^|(?<=[\s(\"“]))([A-Za-z]+) $|([.,!?;:)\"”])\s*$")
+NEXT_WORD = re.compile(r"^ ([A-Za-z]+)(?=\s|[,!?;:]|\.(?:\s|$)|$)|^\s*([.,!?;:)\"”])")
+
+# Hand-labelled negatives for `benchmark_filters`, following the common false positives listed in
+# "song_exploder/README.md" (the positives are the sentences in "song_exploder/filtered").
+NEGATIVE_FIXTURES = [
+    "I had a little drum set in the basement.",
+    "We set up the microphones in the kitchen.",
+    "So I set it up so that the vocal comes in late.",
+    "It was really fun being on the set of the video.",
+    "We met on a set in Atlanta.",
+    "The song is set in a small town.",
+    "There's a set of chords that I keep coming back to.",
+    "The album came out as a box set.",
+    "I set out to write something simpler.",
+    "She set off the alarm by accident.",
+    "It has that skill set you need for producing.",
+    "I wanted to set the tone right at the start.",
+    "That set him off on a whole new direction.",
+    "I just set her voice against the piano.",
+    "It was a cassette that my dad had.",
+    "We recorded it at sunset on the beach.",
+    "I was kind of upset about that.",
+    "We settled on the second take.",
+    "The film crew were all on set at six in the morning.",  # Not excluded by the rules: a known false positive
+    "I set a timer for ten minutes.",  # Likewise
+    "I set itll be fine.",  # "itll" is tokenized as "it" + "ll" (so, "set it")
+]
+
 
 def get_podcast_pages(
         target_url: str = TARGET_URL,
@@ -72,35 +132,53 @@ def get_transcript_urls(
     Returns:
     - list: A list of transcript URLs.
     """
-    if headers is None:
-        headers = HEADERS
-
     transcript_urls = []
     for page in podcast_pages:
         try:
-            req = Request(url=page, headers=headers)
-            resp = urlopen(req)
-            html = resp.read().decode("utf-8")
-            pattern = r'<a\s+href="([^"]+)"[^>]*>click here\.?</a>'
-            match_results = re.search(pattern, html, re.IGNORECASE)
-
-            if match_results:
-                title = match_results.group()
-                pattern = r'<a\s+href="([^"]+)"'
-                match = re.search(pattern, title)
-                if match:
-                    href_value = match.group(1)
-                    transcript_urls.append(href_value)
-                else:
-                    print(page, "... No href found.")
-            else:
-                print(page, "... None found on this page")
+            transcript_url = get_transcript_url(page, headers)
+            if transcript_url is not None:
+                transcript_urls.append(transcript_url)
         except Exception as e:
             print(f"Error occurred: {e}")
 
     return list(dict.fromkeys(transcript_urls))
 
 
+def get_transcript_url(
+        page: str,
+        headers: Optional[dict] = None
+) -> Optional[str]:
+    """
+    Extract the transcript URL from one podcast page.
+
+    Args:
+    - page (str): The podcast page URL.
+    - headers (dict): The headers to include in the HTTP request.
+
+    Returns:
+    - Optional[str]: The transcript URL, or None if the page has none.
+    """
+    if headers is None:
+        headers = HEADERS
+
+    req = Request(url=page, headers=headers)
+    resp = urlopen(req)
+    html = resp.read().decode("utf-8")
+    pattern = r'<a\s+href="([^"]+)"[^>]*>click here\.?</a>'
+    match_results = re.search(pattern, html, re.IGNORECASE)
+
+    if match_results:
+        title = match_results.group()
+        pattern = r'<a\s+href="([^"]+)"'
+        match = re.search(pattern, title)
+        if match:
+            return match.group(1)
+        print(page, "... No href found.")
+    else:
+        print(page, "... None found on this page")
+    return None
+
+
 def extract_transcript_text_from_url(
         transcript_url: str,
         headers: Optional[dict] = None
@@ -115,25 +193,368 @@ def extract_transcript_text_from_url(
     Returns:
     - str: The extracted text.
     """
+    try:
+        return "".join(iter_transcript_pages(transcript_url, headers))
+    except Exception as e:
+        print(f"Error occurred: {e}")
+        return ""
+
+
+def copy_response(
+        response,
+        output_file,
+        chunk_size: int = CHUNK_SIZE
+) -> tuple:
+    """
+    Copy an HTTP response to a (binary) file, one chunk at a time.
+
+    Returns:
+    - tuple: The size (in bytes) and sha256 hash of the content.
+    """
+    size = 0
+    sha256 = hashlib.sha256()
+    for chunk in iter(lambda: response.read(chunk_size), b""):
+        output_file.write(chunk)
+        sha256.update(chunk)
+        size += len(chunk)
+    return size, sha256.hexdigest()
+
+
+def iter_pdf_pages(pdf_file: Union[bytes, Path, str, BinaryIO]) -> Iterator[str]:
+    """
+    Yield the text of each page of a PDF, as it is decoded.
+
+    Args:
+    - pdf_file: The PDF, as bytes, a path, or a (seekable) binary file.
+    """
+    if isinstance(pdf_file, bytes):
+        pdf_file = io.BytesIO(pdf_file)
+    for page in PdfReader(pdf_file).pages:
+        yield page.extract_text()
+
+
+def iter_transcript_pages(
+        transcript_url: str,
+        headers: Optional[dict] = None
+) -> Iterator[str]:
+    """
+    Download a transcript PDF and yield the text of each page in turn (see `iter_pdf_pages`).
+    The PDF is spooled in memory up to `SPOOL_SIZE` bytes, and on disk beyond that.
+    """
     if headers is None:
         headers = HEADERS
+    with SpooledTemporaryFile(max_size=SPOOL_SIZE) as pdf_file:
+        with urlopen(Request(url=transcript_url, headers=headers)) as response:
+            copy_response(response, pdf_file)
+        pdf_file.seek(0)
+        yield from iter_pdf_pages(pdf_file)
+
+
+def iter_sentences(pages: Iterable[str]) -> Iterator[str]:
+    """
+    Yield the sentences (as `split_sentences`) of a text given in pieces (e.g., pages),
+    holding only the current piece and any sentence running on from the last.
+    The sentences are the same as those of the whole text.
+    """
+    remainder = ""
+    for page in pages:
+        sentences = split_sentences(remainder + page)
+        remainder = sentences.pop()
+        yield from sentences
+    yield remainder
+
+
+def stream_transcript(
+        pages: Iterable[str],
+        out_path: Optional[Union[Path, str]] = None,
+        keyword: str = "set"
+) -> list:
+    """
+    Consume a stream of page texts (e.g., `iter_transcript_pages`),
+    writing each page to `out_path` (if given) as it arrives,
+    and keeping only the sentences with `keyword` (as `extract_sentences_with_keywords`).
+
+    Returns:
+    - list: The matching sentences.
+    """
+    if out_path is None:
+        return extract_sentences_with_keywords(pages, keyword)
+    out_path = Path(out_path)
+    temporary_path = out_path.with_name(out_path.name + ".tmp")
+    with open(temporary_path, "w", encoding="utf-8") as output_file:
+        def write_pages():
+            for page in pages:
+                output_file.write(page)
+                yield page
+        matches = extract_sentences_with_keywords(write_pages(), keyword)
+    os.replace(temporary_path, out_path)
+    return matches
+
+
+def _extract_pdf_file(
+        pdf_path: str,
+        out_path: Optional[Path] = None,
+        keyword: Optional[str] = None
+) -> Optional[Union[str, list]]:
+    """
+    Extract the text of a (temporary) PDF file, writing it to `out_path` page by page if given,
+    then delete the PDF.
+
+    Returns:
+    - The text or, given a `keyword`, only the sentences with that keyword (see `stream_transcript`).
+        None if extraction fails.
+    """
     try:
-        req = Request(url=transcript_url, headers=headers)
-        remote_file = urlopen(req).read()
-        memory_file = io.BytesIO(remote_file)
-        pdf_file = PdfReader(memory_file)
-
-        text = ""
-        for page in pdf_file.pages:
-            text += page.extract_text()
-        return text
+        pages = iter_pdf_pages(pdf_path)
+        if keyword is not None:
+            return stream_transcript(pages, out_path, keyword)
+        if out_path is None:
+            return "".join(pages)
+        text = []
+        temporary_path = out_path.with_name(out_path.name + ".tmp")
+        with open(temporary_path, "w", encoding="utf-8") as output_file:
+            for page in pages:
+                output_file.write(page)
+                text.append(page)
+        os.replace(temporary_path, out_path)
+        return "".join(text)
     except Exception as e:
         print(f"Error occurred: {e}")
-        return ""
+        return None
+    finally:
+        os.remove(pdf_path)
+
+
+def fetch_transcripts(
+        transcript_urls: list,
+        out_dir: Optional[Union[Path, str]] = RAW_DIR,
+        headers: Optional[dict] = None,
+        max_per_host: int = 4,
+        max_downloads: int = 16,
+        processes: Optional[int] = None,
+        overwrite: bool = False,
+        manifest: Optional[dict] = None,
+        keyword: Optional[str] = None
+) -> dict:
+    """
+    Download and extract the text of many transcripts at once:
+    downloads run concurrently in threads (at most `max_per_host` at a time to any one host),
+    each streamed to a temporary file (rather than held in memory),
+    and each PDF is passed to a pool of processes for text extraction as soon as it arrives,
+    with the text written to `out_dir` page by page.
+
+    Args:
+    - transcript_urls (list): The transcript URLs.
+    - out_dir: Where to write each text (as `url_to_file_name(url)`), or None to skip writing.
+    - headers (dict): The headers to include in the HTTP requests.
+    - max_per_host (int): The maximum number of simultaneous downloads from any one host.
+    - max_downloads (int): The maximum number of simultaneous downloads overall.
+    - processes (int): The number of extraction processes. Defaults to the number of CPUs.
+    - overwrite (bool): If False, read any text already in `out_dir` rather than downloading it again.
+    - manifest (dict): Optionally, the transcript entries of a manifest (see `load_manifest`), updated in place.
+        Transcripts already extracted to `out_dir` are then re-checked rather than simply read:
+        with a conditional request (by ETag) or, where the server gives none, a HEAD request
+        (comparing the Last-Modified date or, failing that, the size), and, failing that, by content hash,
+        so that only new or changed transcripts are extracted again.
+    - keyword (str): If given, return only the sentences with this keyword, not the whole text.
+        These are matched page by page as each PDF is decoded (see `stream_transcript`),
+        in the extraction processes, so no whole transcript is ever held in memory.
+
+    Returns:
+    - dict: URL -> extracted text (or matching sentences, given a `keyword`),
+        for each transcript retrieved successfully.
+    """
+    if headers is None:
+        headers = HEADERS
+    start = time.perf_counter()
+    texts = {}
+    to_fetch = []
+    for url in dict.fromkeys(transcript_urls):
+        is_local = out_dir is not None and not overwrite and (Path(out_dir) / url_to_file_name(url)).exists()
+        if is_local and manifest is None:
+            texts[url] = _read_transcript(Path(out_dir) / url_to_file_name(url), keyword)
+        else:
+            to_fetch.append(url)
+    n_local = len(texts)
+
+    host_limits = {
+        host: threading.BoundedSemaphore(max_per_host)
+        for host in {urlparse(url).netloc for url in to_fetch}
+    }
+
+    def is_current(url):
+        entry = manifest.get(url, {}) if manifest is not None else {}
+        return (
+            not overwrite and out_dir is not None and entry.get("status") == "extracted"
+            and (Path(out_dir) / url_to_file_name(url)).exists()
+        )
+
+    def validators(response):
+        return {"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}
+
+    def unchanged_by_head(url):  # Without an ETag: compare the Last-Modified date (or failing that, the size)
+        entry = manifest[url]
+        response = urlopen(Request(url=url, headers=headers, method="HEAD"))
+        last_modified = response.headers.get("Last-Modified")
+        size = response.headers.get("Content-Length")
+        if last_modified is not None and entry.get("last_modified") is not None:
+            return last_modified == entry["last_modified"]
+        return size is not None and entry.get("size") is not None and int(size) == entry["size"]
+
+    def download(url):
+        request_headers = dict(headers)
+        current = is_current(url)
+        if current and manifest[url].get("etag"):
+            request_headers["If-None-Match"] = manifest[url]["etag"]
+        with host_limits[urlparse(url).netloc]:
+            if current and not manifest[url].get("etag") and unchanged_by_head(url):
+                return None, None, None, {k: manifest[url].get(k) for k in ("etag", "last_modified")}
+            try:
+                response = urlopen(Request(url=url, headers=request_headers))
+            except HTTPError as e:
+                if e.code == 304:  # Not modified
+                    return None, None, None, {k: manifest[url].get(k) for k in ("etag", "last_modified")}
+                raise
+            with response, NamedTemporaryFile(suffix=".pdf", delete=False) as pdf_file:
+                try:
+                    size, sha256 = copy_response(response, pdf_file)
+                except Exception:
+                    os.remove(pdf_file.name)
+                    raise
+            return pdf_file.name, size, sha256, validators(response)
+
+    # Processes are started by a fork server (or spawned, where fork is not available), not forked from here:
+    # forking while the download threads run can deadlock.
+    start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    mp_context = multiprocessing.get_context(start_method)
+    with ThreadPoolExecutor(max_downloads) as downloads, ProcessPoolExecutor(processes, mp_context) as extractions:
+        download_futures = {downloads.submit(download, url): url for url in to_fetch}
+        extraction_futures = {}
+        for future in as_completed(download_futures):
+            url = download_futures[future]
+            try:
+                pdf_path, size, sha256, response_validators = future.result()
+            except Exception as e:
+                print(f"{url}: Error occurred: {e}")
+                if manifest is not None:
+                    manifest.setdefault(url, {"file": url_to_file_name(url)})["status"] = "download failed"
+                continue
+
+            if manifest is not None:
+                entry = manifest.setdefault(url, {"file": url_to_file_name(url)})
+                entry.update(response_validators)
+                if pdf_path is not None:
+                    unchanged = is_current(url) and entry.get("sha256") == sha256
+                    entry["size"] = size
+                    entry["sha256"] = sha256
+                    if unchanged:  # Same content: no need to extract again
+                        os.remove(pdf_path)
+                        pdf_path = None
+                if pdf_path is None:
+                    texts[url] = _read_transcript(Path(out_dir) / url_to_file_name(url), keyword)
+                    n_local += 1
+                    continue
+
+            out_path = None if out_dir is None else Path(out_dir) / url_to_file_name(url)
+            extraction_futures[extractions.submit(_extract_pdf_file, pdf_path, out_path, keyword)] = url
+
+        for future in as_completed(extraction_futures):
+            url = extraction_futures[future]
+            text = future.result()
+            if manifest is not None:
+                manifest[url]["status"] = "extraction failed" if text is None else "extracted"
+            if text is not None:
+                texts[url] = text
+
+    print(f"Retrieved {len(texts) - n_local} of {len(to_fetch)} transcripts "
+          f"({n_local} unchanged) in {time.perf_counter() - start:.1f}s")
+    return texts
+
+
+def _read_transcript(
+        path: Path,
+        keyword: Optional[str] = None
+) -> Union[str, list]:
+    """
+    Read a local transcript: the whole text or, given a `keyword`,
+    only the sentences with that keyword (reading line by line).
+    """
+    with open(path, "r", encoding="utf-8") as input_file:
+        if keyword is None:
+            return input_file.read()
+        return extract_sentences_with_keywords(input_file, keyword)
+
+
+def load_manifest(path: Union[Path, str] = MANIFEST_PATH) -> dict:
+    """
+    Load the manifest of transcripts retrieved so far (or a new, empty one if there is no file), with:
+    - "pages": each podcast page checked, mapped to its transcript URL (or None if it has none);
+    - "transcripts": for each transcript URL,
+      the local "file" name, the server's "etag" and "last_modified" date,
+      the PDF "size" and "sha256" content hash,
+      and the extraction "status" ("extracted", "extraction failed", or "download failed").
+    """
+    path = Path(path)
+    if not path.exists():
+        return {"pages": {}, "transcripts": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(
+        manifest: dict,
+        path: Union[Path, str] = MANIFEST_PATH
+) -> None:
+    """
+    Write the manifest (with sorted keys, so unchanged content gives an identical file),
+    via a temporary file so that an interrupted run never leaves a partial manifest.
+    """
+    path = Path(path)
+    temporary_path = path.with_suffix(".tmp")
+    with open(temporary_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+        f.write("\n")
+    os.replace(temporary_path, path)
+
+
+def sync_transcripts(
+        transcript_urls: Optional[list] = None,
+        manifest_path: Union[Path, str] = MANIFEST_PATH,
+        out_dir: Union[Path, str] = RAW_DIR,
+        **kwargs
+) -> dict:
+    """
+    Bring the local transcripts (`out_dir`) up to date with the manifest:
+    fetch and extract only transcripts that are new, changed, or previously failed.
+
+    Args:
+    - transcript_urls (list): The transcript URLs.
+        Defaults to those stored in `song_exploder.se_urls` plus any new ones (see `check_local_list`).
+    - manifest_path: The manifest (see `load_manifest`).
+    - out_dir: Where to write each text.
+    - kwargs: Passed to `fetch_transcripts`.
+
+    Returns:
+    - dict: URL -> extracted text (or matching sentences: see `fetch_transcripts`),
+        for the new or changed transcripts only.
+    """
+    manifest = load_manifest(manifest_path)
+    if transcript_urls is None:
+        from song_exploder import se_urls
+        transcript_urls = list(se_urls) + check_local_list(manifest)
+
+    entries = manifest["transcripts"]
+    before = {url: (entry.get("sha256"), entry.get("status")) for url, entry in entries.items()}
+    texts = fetch_transcripts(transcript_urls, out_dir, manifest=entries, **kwargs)
+    save_manifest(manifest, manifest_path)
+    return {
+        url: text for url, text in texts.items()
+        if before.get(url) != (entries[url].get("sha256"), entries[url].get("status"))
+    }
 
 
 def extract_sentences_with_keywords(
-        text: str,
+        text: Union[str, Iterable[str]],
         keyword: str = "set"
 ) -> list:
     """
@@ -141,19 +562,90 @@ def extract_sentences_with_keywords(
     and return that sentence lightly adapted to replace all white space with single regular space.
 
     Args:
-    - text (str): The overall text to process.
+    - text: The overall text to process, or that text in pieces (e.g., pages: see `iter_sentences`).
     - keyword (str): The character string to match.
 
     Returns:
     - list: list of matching, and lightly pre-processed sentences.
     """
-    sentences = re.split(r'(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=[.?])\s', text)
+    sentences = split_sentences(text) if isinstance(text, str) else iter_sentences(text)
     return [
         re.sub(r'\s+', ' ', s)
         for s in sentences if keyword in s
     ]
 
 
+def split_sentences(text: str) -> list:
+    """
+    Split a text into sentences (at white space following "." or "?", except after abbreviations like "e.g." or "Mr.").
+    """
+    return re.split(r'(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=[.?])\s', text)
+
+
+def get_nlp():
+    """
+    The spaCy pipeline, loaded once (on first use) and shared.
+    The filter only needs tokens, so all other components are disabled (see `NLP_DISABLE`).
+    """
+    global _nlp
+    if _nlp is None:
+        _nlp = spacy.load(NLP_MODEL, disable=NLP_DISABLE)
+    return _nlp
+
+
+def fast_filter(sentence: str) -> Optional[bool]:
+    """
+    The decision of `filter_true_positives` by regular expressions alone, where that is unambiguous:
+    the first lowercase word including "set", and the words either side,
+    standing in for the spaCy tokens in the rules of `_filter_tokens`.
+
+    Returns:
+    - Optional[bool]: The decision, or None where the tokenization is not clear (leave these to spaCy).
+    This includes words that are one of the tokenizer's exceptions ("special cases"),
+    many of which split a run of letters, e.g. "itll" ("it", "ll"), "cannot" ("can", "not").
+    """
+    global _special_cases
+    if "setlist" in sentence:
+        print("Match: `setlist`.")
+        return True
+
+    word = SET_WORD.search(sentence)
+    if word is None:
+        return False
+    before, after = sentence[:word.start()], sentence[word.end():]
+    if (before and not before[-1].isspace()) or (after and not after[0].isspace() and after[0] not in ".,!?;:"):
+        return None  # E.g., "live-set", "set's": spaCy splits these its own way.
+
+    if _special_cases is None:
+        _special_cases = frozenset(get_nlp().tokenizer.rules)
+    if word.group() in _special_cases:
+        return None
+
+    if word.group() not in ("set", "sets"):
+        print(f"Excluding: {word.group()}")  # E.g. "set" within a longer word list "cassette".
+        return False
+
+    next_match = NEXT_WORD.match(after)
+    if next_match is None or next_match.group(1) in _special_cases:
+        return None  # Including "set" as the last character (see `_filter_tokens`).
+    next_word = next_match.group(1) or next_match.group(2)
+    if next_word in EXCLUDE_NEXT:
+        print(f"Excluding: `set {next_word}`.")
+        return False
+
+    if before.strip():
+        previous_match = PREVIOUS_WORD.search(before)
+        if previous_match is None or previous_match.group(1) in _special_cases:
+            return None
+        previous_word = previous_match.group(1)
+        if previous_word in EXCLUDE_PREVIOUS:
+            print(f"Excluding: `{previous_word} set`.")
+            return False
+
+    print(f"Match: {word.group()} {next_word}")
+    return True
+
+
 def filter_true_positives(sentence: str) -> bool:
     """
     Given a sentence with the keyword (here "set") in it, take a closer look for true positives.
@@ -180,56 +672,157 @@ def filter_true_positives(sentence: str) -> bool:
     Returns:
     - list: bool, True is the sentences matches the given criteria.
     """
-    if "setlist" in sentence:
-        print("Match: `setlist`.")
-        return True
-    else:
-        exclude_previous = ["box", "drum", "skill", "sun"] # "skill set" ...
-        exclude_next = ["against", "her", "him", "in", "it", "of", "off", "out", "up", "the"]
+    decision = fast_filter(sentence)
+    if decision is not None:
+        return decision
+    return _filter_tokens(get_nlp()(sentence))
 
-        nlp = spacy.load("en_core_web_sm")
-        this_case = nlp(sentence)
 
-        for token in this_case:
+def filter_sentences(
+        sentences: list,
+        batch_size: int = 256,
+        n_process: int = 1,
+        fast_path: bool = True
+) -> list:
+    """
+    As `filter_true_positives`, for many sentences at once:
+    sentences are decided by `fast_filter` where possible,
+    and the rest are tokenized together in batches (`nlp.pipe`), optionally across `n_process` processes.
 
-            if "set" in token.text: # Token at least _includes_ "set" (maybe be longer)
+    Args:
+    - sentences (list): The sentences to process.
+    - batch_size (int): The number of sentences per batch.
+    - n_process (int): The number of processes for `nlp.pipe`.
+    - fast_path (bool): Use `fast_filter`. If False, decide only "setlist" cases directly, and use spaCy for the rest.
+
+    Returns:
+    - list: bool, for each sentence, True if it matches the criteria.
+    """
+    decisions = []
+    to_tokenize = []
+    for i, s in enumerate(sentences):
+        if fast_path:
+            decisions.append(fast_filter(s))
+        elif "setlist" in s:
+            print("Match: `setlist`.")
+            decisions.append(True)
+        else:
+            decisions.append(None)
+        if decisions[i] is None:
+            to_tokenize.append(i)
+    docs = get_nlp().pipe((sentences[i] for i in to_tokenize), batch_size=batch_size, n_process=n_process)
+    for i, doc in zip(to_tokenize, docs):
+        decisions[i] = _filter_tokens(doc)
+    return decisions
 
-                if token.text not in ("set", "sets"):
-                    print(f"Excluding: {token.text}")  # E.g. "set" within a longer word list "cassette".
-                    return False
 
-                if token.i == len(this_case):  # The token is exactly "set" or  "sets"
-                    print(f"Match: last word is `{token.text}`.")
-                    return True
+def _filter_tokens(this_case) -> bool:
+    """
+    The token-level rules of `filter_true_positives`, given the tokenized sentence (a spaCy `Doc`).
+    """
+    for token in this_case:
 
-                next_token = this_case[token.i + 1]
+        if "set" in token.text: # Token at least _includes_ "set" (maybe be longer)
 
-                if next_token == "list":
-                    print("Match: `set list`")
-                    return True
-                if next_token.text in exclude_next:
-                    print(f"Excluding: `set {next_token}`.")
-                    return False
-                if token.i > 0:
-                    prev_token = this_case[token.i - 1]
-                    if prev_token.text in exclude_previous:
-                        print(f"Excluding: `{prev_token} set`.")
-                        return False
+            if token.text not in ("set", "sets"):
+                print(f"Excluding: {token.text}")  # E.g. "set" within a longer word list "cassette".
+                return False
 
-                print(f"Match: {token.text} {next_token.text}")
+            if token.i == len(this_case):  # The token is exactly "set" or  "sets"
+                print(f"Match: last word is `{token.text}`.")
                 return True
 
-        return False
+            next_token = this_case[token.i + 1]
+
+            if next_token == "list":
+                print("Match: `set list`")
+                return True
+            if next_token.text in EXCLUDE_NEXT:
+                print(f"Excluding: `set {next_token}`.")
+                return False
+            if token.i > 0:
+                prev_token = this_case[token.i - 1]
+                if prev_token.text in EXCLUDE_PREVIOUS:
+                    print(f"Excluding: `{prev_token} set`.")
+                    return False
+
+            print(f"Match: {token.text} {next_token.text}")
+            return True
+
+    return False
 
 
-def check_local_list() -> list:
+def load_fixtures() -> list:
+    """
+    A small labelled set of sentences for checking the filters:
+    the true positives stored in "song_exploder/filtered" (see the README there),
+    and the hand-labelled negatives in `NEGATIVE_FIXTURES`.
+
+    Returns:
+    - list: (sentence, label) pairs.
+    """
+    fixtures = []
+    for f in sorted(FILTERED_DIR.glob("*.txt")):
+        with open(f, "r", encoding="utf-8") as input_file:
+            for line in input_file:
+                line = line.strip()
+                if line and line != f.name:  # `main` writes the file name first
+                    fixtures.extend((s, True) for s in extract_sentences_with_keywords(line))
+    fixtures.extend((s, False) for s in NEGATIVE_FIXTURES)
+    return fixtures
+
+
+def benchmark_filters(
+        fixtures: Optional[list] = None,
+        repeat: int = 20
+) -> dict:
+    """
+    Compare the fast path (`fast_filter` with spaCy as fallback) against spaCy alone (`filter_sentences`)
+    on labelled sentences (by default, `load_fixtures()`):
+    how often they agree, the accuracy of each against the labels, and the speed-up.
+
+    Note that the first `nlp.pipe` call includes loading the model, so run this twice for a fair timing.
+    """
+    if fixtures is None:
+        fixtures = load_fixtures()
+    sentences = [s for s, _ in fixtures]
+    labels = [label for _, label in fixtures]
+
+    results = {}
+    for name, fast_path in (("spacy", False), ("fast", True)):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            decisions = filter_sentences(sentences, fast_path=fast_path)
+        results[name] = decisions
+        results[f"{name}_seconds"] = (time.perf_counter() - start) / repeat
+        results[f"{name}_accuracy"] = sum(d == label for d, label in zip(decisions, labels)) / len(labels)
+
+    results["agreement"] = sum(a == b for a, b in zip(results["spacy"], results["fast"])) / len(sentences)
+    results["fast_path_share"] = sum(fast_filter(s) is not None for s in sentences) / len(sentences)
+    results["speed_up"] = results["spacy_seconds"] / max(results["fast_seconds"], 1e-9)
+    print({k: v for k, v in results.items() if k not in ("spacy", "fast")})
+    return results
+
+
+def check_local_list(manifest: Optional[dict] = None) -> list:
     """
     Retrieve the latest list of podcast pages and check this against the local collection.
     Return a list of new pages not currently included in the local list.
+
+    Given a manifest (see `load_manifest`), only pages not already recorded there are visited,
+    and the transcript URL found on each is recorded (updating the manifest in place).
     """
     from song_exploder import se_urls as stored_transcript_urls
     podcast_pages = get_podcast_pages(TARGET_URL, HEADERS)
-    found_transcript_urls = get_transcript_urls(podcast_pages, HEADERS)
+    pages = {} if manifest is None else manifest["pages"]
+    for page in podcast_pages:
+        if page in pages:
+            continue
+        try:
+            pages[page] = get_transcript_url(page, HEADERS)
+        except Exception as e:
+            print(f"Error occurred: {e}")  # Not recorded, so tried again next time
+    found_transcript_urls = dict.fromkeys(pages[p] for p in podcast_pages if pages.get(p))
     return [x for x in found_transcript_urls if x not in stored_transcript_urls]
 
 
@@ -251,21 +844,73 @@ def url_to_file_name(url: str) -> str:
     return file_name + ".txt"
 
 
+def write_matches(
+        file_name: str,
+        matches: list
+) -> None:
+    """
+    Write (or overwrite) the matches for one transcript to "song_exploder" / "filtered" / `file_name`,
+    starting with the file name.
+    If there are no matches, remove any file from an earlier run instead
+    (e.g., for a transcript that has changed), so that the directory is the same as after a fresh run.
+    """
+    path_to_file = FILTERED_DIR / file_name
+    if not matches:
+        if path_to_file.exists():
+            os.remove(path_to_file)
+        return
+    with open(path_to_file, "w", encoding="utf-8") as output_file:
+        output_file.write(file_name + '\n')
+        for m in matches:
+            output_file.write(m + '\n')
+
+
 def process_text(text: str) -> list:
     """
     First, organise into sentence and filter for any with the character string "set"
     (`extract_sentences_with_keywords()`).
     Then, only in those (rare) cases of a sentence with "set" further, undertake a closer look for true positives
-    (`filter_true_positives()`).
+    (`filter_true_positives()`, here batched with `filter_sentences()`).
     """
-    matches = []
-    sentences = extract_sentences_with_keywords(text)
-    for s in sentences:
-        if filter_true_positives(s):
-            print("match:", s)
-            matches.append(s)
+    return process_texts([text])[0]
 
-    return matches
+
+def process_texts(
+        texts: list,
+        n_process: int = 1
+) -> list:
+    """
+    As `process_text`, for many texts at once:
+    the candidate sentences from all texts go through `filter_sentences()` together.
+
+    Returns:
+    - list: The list of matches for each text.
+    """
+    return filter_candidates([extract_sentences_with_keywords(text) for text in texts], n_process)
+
+
+def filter_candidates(
+        sentences: list,
+        n_process: int = 1
+) -> list:
+    """
+    The second step of `process_texts`, for the candidate sentences ("set" in any context) already
+    extracted from each text (e.g., by `fetch_transcripts` with `keyword="set"`).
+
+    Returns:
+    - list: The list of matches for each text.
+    """
+    flat = [s for text_sentences in sentences for s in text_sentences]
+    decisions = iter(filter_sentences(flat, n_process=n_process))
+    all_matches = []
+    for text_sentences in sentences:
+        matches = []
+        for s in text_sentences:
+            if next(decisions):
+                print("match:", s)
+                matches.append(s)
+        all_matches.append(matches)
+    return all_matches
 
 
 def main(
@@ -279,50 +924,36 @@ def main(
     Args:
         use_local_raw_text: Search on already downloaded raw text files ... if False then ...
         use_local_url_list: Search online, but using the already retrieved list of URLs
-        ... if false then everything is from scratch.
+        ... if false then also look for new episodes,
+        visiting only those podcast pages not yet recorded in the manifest (see `check_local_list`).
         write_local: Write the raw text to local files when retrieved.
     """
     if use_local_raw_text:
-        raw_dir = THIS_DIR / "song_exploder" / "raw"
+        raw_dir = RAW_DIR
         files = [f for f in raw_dir.glob('*.txt') if f.is_file()]
         print(len(files))
 
-        for f in files:
-            with open(f, "r", encoding="utf-8") as input_file:
-                text_content = input_file.read()
-                matches = process_text(text_content)
-                if not matches:
-                    continue
-                output_file_name = THIS_DIR / "song_exploder" / "filtered" /  f.name
-                with open(output_file_name, "w", encoding="utf-8") as output_file:
-                    output_file.write(f.name + '\n')
-                    for m in matches:
-                        output_file.write(m + '\n')
+        candidates = [_read_transcript(f, keyword="set") for f in files]
+        for f, matches in zip(files, filter_candidates(candidates)):
+            write_matches(f.name, matches)
 
     else:
         if use_local_url_list:
             from song_exploder import se_urls as transcript_urls
         else:
-            podcast_pages = get_podcast_pages(TARGET_URL, HEADERS)
-            transcript_urls = get_transcript_urls(podcast_pages, HEADERS)
-
-        for transcript_url in transcript_urls:
-            print(transcript_url)
-            text = extract_transcript_text_from_url(transcript_url, HEADERS)
-
-            if write_local:
-                output_file_path = THIS_DIR / "song_exploder" / "raw" / url_to_file_name(transcript_url)
-
-                with open(output_file_path, "a", encoding="utf-8") as output_file:
-                    output_file.write(text)
-
-            matches = process_text(text)
-            if matches:
-                file_name = url_to_file_name(transcript_url)
-                output_file_path = THIS_DIR / "song_exploder" / "filtered" /  file_name
-                with open(output_file_path, "r", encoding="utf-8") as output_file:
-                    for m in matches:
-                        output_file.write(m + '\n')
+            from song_exploder import se_urls
+            manifest = load_manifest()
+            transcript_urls = list(se_urls) + check_local_list(manifest)
+            save_manifest(manifest)
+
+        # Candidate sentences only, matched page by page as each transcript is extracted
+        if write_local:  # Only new or changed transcripts
+            candidates = sync_transcripts(transcript_urls, keyword="set")
+        else:
+            candidates = fetch_transcripts(transcript_urls, None, HEADERS, keyword="set")
+
+        for transcript_url, matches in zip(candidates, filter_candidates(list(candidates.values()))):
+            write_matches(url_to_file_name(transcript_url), matches)
 
 
 if __name__ == "__main__":
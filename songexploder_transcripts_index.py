@@ -0,0 +1,229 @@
+"""
+A persistent, sentence-level full-text index of the Song Exploder transcripts
+("song_exploder/raw/*.txt", see `songexploder_transcript_scrape.py`),
+so that exploring a new research term (e.g. "encore", "opener", "running order")
+is one indexed query, not another pass (and spaCy run) over every transcript.
+
+The index is an SQLite FTS5 table (one row per sentence) at `utils.TRANSCRIPTS_DB`, and supports:
+- multi-term queries (all terms, or any term),
+- phrase queries,
+- ranking by BM25,
+- incremental updates: `add_directory` (re)indexes only new or changed transcripts.
+
+For instance:
+
+    index = TranscriptIndex()
+    index.add_directory()
+    index.search("encore")
+    index.search("set list", mode="phrase")
+    index.counts("opener closer", mode="any")
+
+Note: FTS5 is included in the SQLite builds shipped with Python on all common platforms.
+"""
+
+__author__ = "Mark Gotham"
+
+import hashlib
+from pathlib import Path
+import re
+import sqlite3
+from typing import Union
+
+import pandas as pd
+
+from songexploder_transcript_scrape import RAW_DIR, split_sentences
+from utils import TRANSCRIPTS_DB
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcripts (
+    file TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    sentences INTEGER NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS sentences USING fts5(
+    sentence,
+    file UNINDEXED,
+    position UNINDEXED,
+    tokenize = "unicode61 remove_diacritics 2"
+);
+"""
+
+MODES = ("all", "any", "phrase")
+
+
+def build_query(
+        text: str,
+        mode: str = "all"
+) -> str:
+    """
+    Convert plain text into an FTS5 query, quoting each term (so punctuation is never read as syntax).
+
+    Args:
+        text (str): One or more words.
+        mode (str): "all" (sentences with every word), "any" (with at least one), or
+            "phrase" (with the words together, in order).
+
+    Returns:
+        str: The FTS5 query.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Invalid mode {mode}: choose one of {MODES}.")
+    terms = re.findall(r"\w+", text)
+    if not terms:
+        raise ValueError(f"No terms to search for in {text!r}.")
+    if mode == "phrase":
+        return '"' + " ".join(terms) + '"'
+    operator = " OR " if mode == "any" else " AND "
+    return operator.join(f'"{t}"' for t in terms)
+
+
+class TranscriptIndex:
+    """
+    A full-text index of transcripts, one row per sentence, stored at `db_path`.
+    """
+
+    def __init__(self, db_path: Union[Path, str] = TRANSCRIPTS_DB):
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path)
+        self.connection.executescript(SCHEMA)
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM transcripts").fetchone()[0]
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def add_text(
+            self,
+            file_name: str,
+            text: str
+    ) -> bool:
+        """
+        Index one transcript, replacing any earlier version with the same file name.
+
+        Returns:
+            bool: Whether anything changed (False if this exact text is already indexed).
+        """
+        sha256 = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        row = self.connection.execute("SELECT sha256 FROM transcripts WHERE file = ?", (file_name,)).fetchone()
+        if row is not None and row[0] == sha256:
+            return False
+        sentences = [re.sub(r"\s+", " ", s).strip() for s in split_sentences(text)]
+        sentences = [s for s in sentences if s]
+        with self.connection:
+            self.connection.execute("DELETE FROM sentences WHERE file = ?", (file_name,))
+            self.connection.executemany(
+                "INSERT INTO sentences (sentence, file, position) VALUES (?, ?, ?)",
+                [(s, file_name, i) for i, s in enumerate(sentences)]
+            )
+            self.connection.execute(
+                "INSERT OR REPLACE INTO transcripts VALUES (?, ?, ?)",
+                (file_name, sha256, len(sentences))
+            )
+        return True
+
+    def remove(self, file_name: str) -> None:
+        """
+        Remove a transcript from the index.
+        """
+        with self.connection:
+            self.connection.execute("DELETE FROM sentences WHERE file = ?", (file_name,))
+            self.connection.execute("DELETE FROM transcripts WHERE file = ?", (file_name,))
+
+    def add_directory(
+            self,
+            raw_dir: Union[Path, str] = RAW_DIR,
+            prune: bool = False
+    ) -> list:
+        """
+        Index every "*.txt" transcript in `raw_dir` that is new or has changed since it was last indexed.
+
+        Args:
+            raw_dir: The directory of transcripts.
+            prune (bool): Also remove transcripts that are no longer in `raw_dir`.
+
+        Returns:
+            list: The names of the files (re)indexed.
+        """
+        added = []
+        present = set()
+        for path_to_file in sorted(Path(raw_dir).glob("*.txt")):
+            present.add(path_to_file.name)
+            with open(path_to_file, "r", encoding="utf-8") as file:
+                if self.add_text(path_to_file.name, file.read()):
+                    added.append(path_to_file.name)
+        if prune:
+            for (file_name,) in self.connection.execute("SELECT file FROM transcripts").fetchall():
+                if file_name not in present:
+                    self.remove(file_name)
+        print(f"Indexed {len(added)} new or changed transcripts ({len(self)} in total).")
+        return added
+
+    def search(
+            self,
+            text: str,
+            mode: str = "all",
+            k: int = 20,
+            raw: bool = False
+    ) -> pd.DataFrame:
+        """
+        The `k` best matching sentences, ranked by BM25.
+
+        Args:
+            text (str): The search terms.
+            mode (str): "all", "any", or "phrase" (see `build_query`).
+            k (int): The maximum number of sentences to return (None for all).
+            raw (bool): Pass `text` directly as an FTS5 query (e.g. for prefixes: "set*", or `NEAR`).
+
+        Returns:
+            pd.DataFrame: file, position (of the sentence in the transcript), sentence, and
+            score (the BM25 score: higher is better).
+        """
+        sql = (
+            "SELECT file, position, sentence, -bm25(sentences) AS score FROM sentences "
+            "WHERE sentences MATCH ? ORDER BY bm25(sentences)"
+        )
+        params = (text if raw else build_query(text, mode),)
+        if k is not None:
+            sql += " LIMIT ?"
+            params += (k,)
+        return pd.read_sql_query(sql, self.connection, params=params)
+
+    def counts(
+            self,
+            text: str,
+            mode: str = "all",
+            raw: bool = False
+    ) -> pd.DataFrame:
+        """
+        The number of matching sentences in each transcript, most first.
+        """
+        sql = (
+            "SELECT file, COUNT(*) AS matches FROM sentences WHERE sentences MATCH ? "
+            "GROUP BY file ORDER BY matches DESC, file"
+        )
+        return pd.read_sql_query(sql, self.connection, params=(text if raw else build_query(text, mode),))
+
+    def context(
+            self,
+            file_name: str,
+            position: int,
+            window: int = 1
+    ) -> list:
+        """
+        The sentences either side of (and including) sentence `position` in this transcript.
+        """
+        rows = self.connection.execute(
+            "SELECT sentence FROM sentences WHERE file = ? AND position BETWEEN ? AND ? ORDER BY position",
+            (file_name, position - window, position + window)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+
+if __name__ == "__main__":
+    index = TranscriptIndex()
+    index.add_directory()
+    for term in ("encore", "opener", "set list"):
+        print(term)
+        print(index.search(term, mode="phrase", k=5))
@@ -17,7 +17,9 @@ import numpy as np
 import pandas as pd
 import spotipy
 import time
+from typing import Optional
 
+from local_titles_match import TitleIndex
 from utils import default_band_list, SPOTIFY_ID, SPOTIFY_SECRET, THIS_DIR
 
 
@@ -102,31 +104,51 @@ def get_track_data(
         artist: str,
         tracks: list,
         sp: spotipy.Spotify = authenticate_spotify(),
-        write: bool = True
+        write: bool = True,
+        index: Optional[TitleIndex] = None
 ) -> pd.DataFrame:
     """
     Save track data to a CSV file.
 
+    Variant titles ("Fix You (acoustic)", "fix you", typos ...) of a track that is already resolved
+    re-use that result rather than calling the API again (see `local_titles_match`).
+    Only genuinely new titles are searched for.
+    Each part of a medley ("Song A / Song B") is resolved separately, with one row per part:
+    the "track" column gives the title as listed, and "part" the part resolved
+    (the same as "track" for anything other than a medley).
+
     Args:
         artist (str): The name of the artist.
         tracks (list): A list of unique tracks.
         sp (spotipy.Spotify): An authenticated Spotify client.
         write: Write the data to a local csv.
+        index (TitleIndex, optional): Index of already resolved titles.
+            Defaults to one built from any existing "data" / f"{artist}_tracks.csv".
+            New results are added to it as they come in.
 
     Returns:
         pd.DataFrame: A DataFrame containing track data.
     """
+    if index is None:
+        index = TitleIndex.from_track_csv([artist])
 
     track_data = {
         "track": [],
+        "part": [],
         "found": [],
         "id": []
     }
     for track in tracks:
-        track_name, track_id = search_track(sp, track, artist)
-        track_data["track"].append(track)
-        track_data["found"].append(track_name)
-        track_data["id"].append(track_id)
+        for part, match in index.lookup_medley(artist, track):
+            if match is None:
+                track_name, track_id = search_track(sp, part, artist)
+                index.add(artist, part, (track_name, track_id))
+            else:
+                track_name, track_id = match[1]
+            track_data["track"].append(track)
+            track_data["part"].append(part)
+            track_data["found"].append(track_name)
+            track_data["id"].append(track_id)
     df = pd.DataFrame(track_data)
 
     track_df = THIS_DIR / "data" / f"{artist}_tracks.csv"
@@ -26,6 +26,12 @@ SPOTIFY_SECRET = "put your secrets here ... only the Spotify ones though ... ;)"
 
 MUSICBRAINZ_BASE_URL = "https://musicbrainz.org/ws/2"
 MUSICBRAINZ_HEADER = "{PROJECT}/{version} ({email or url})"
+MUSICBRAINZ_DUMP_DB = THIS_DIR / "data" / "musicbrainz.sqlite"  # Local store, see `musicbrainz_dump.py`
+MUSICBRAINZ_CACHE_DB = THIS_DIR / "data" / "musicbrainz_cache.sqlite"  # Memoised API lookups
+
+SONGS_DB = THIS_DIR / "data" / "songs.sqlite"  # Cross-source song IDs, see `local_songs_resolve.py`
+SETLISTS_DB = THIS_DIR / "data" / "setlists.sqlite"  # Queryable corpus, see `local_database_build.py`
+TRANSCRIPTS_DB = THIS_DIR / "song_exploder" / "transcripts.sqlite"  # See `songexploder_transcripts_index.py`
 
 
 default_band_id_dict = {